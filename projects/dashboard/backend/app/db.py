@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import json
 import os
 import sqlite3
+import threading
 import time
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
 
 from .settings import get_settings
 
@@ -16,15 +22,147 @@ def db_path() -> Path:
     return p
 
 
-def get_conn() -> sqlite3.Connection:
+T = TypeVar("T")
+
+STATEMENT_CACHE = 256  # prepared statements kept per connection
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by the threads of one process.
+
+    Connections run in WAL mode with ``synchronous=NORMAL`` and a busy timeout,
+    so readers never block the writer and concurrent writers (other threads,
+    other gunicorn workers) wait for the lock instead of failing with
+    ``database is locked``. Each keeps its own prepared-statement cache, which
+    only pays off because connections are reused.
+    """
+
+    def __init__(self, path: Path, size: int, busy_timeout: float):
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self._idle: list[sqlite3.Connection] = []
+        self._cond = threading.Condition()
+        self._open = 0
+        self.acquired = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        started = time.perf_counter()
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                self._cond.wait()
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._open += 1
+        waited = time.perf_counter() - started
+        self.acquired += 1
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                self._discard(None)
+                raise
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()  # caller raised before commit
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn: Optional[sqlite3.Connection]) -> None:
+        if conn is not None:
+            conn.close()
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "open": self._open,
+            "idle": len(self._idle),
+            "acquired": self.acquired,
+            "waits": self.waits,
+            "wait_total": round(self.wait_total, 4),
+            "wait_max": round(self.wait_max, 4),
+        }
+
+
+_pools: dict[Path, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+
+def pool() -> ConnectionPool:
     path = db_path()
-    conn = sqlite3.connect(path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    p = _pools.get(path)
+    if p is None:
+        with _pools_lock:
+            p = _pools.get(path)
+            if p is None:
+                s = get_settings()
+                p = _pools[path] = ConnectionPool(path, s.db_pool_size, s.db_busy_timeout)
+    return p
+
+
+def connection():
+    """Borrow a pooled connection: ``with connection() as conn: ...``."""
+    return pool().connection()
+
+
+async def run(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Async wrapper for the helpers below. The executor is no larger than the
+    # pool, so a queued call waits here rather than parking a thread on the pool.
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=get_settings().db_pool_size, thread_name_prefix="db")
+    return await asyncio.get_running_loop().run_in_executor(_executor, lambda: fn(*args, **kwargs))
+
+
+def ping() -> bool:
+    with connection() as conn:
+        conn.execute("SELECT 1")
+    return True
 
 
 def init_db() -> None:
-    conn = get_conn()
+    with connection() as conn:
+        _create_tables(conn)
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
     cur.execute(
         """
@@ -39,43 +177,201 @@ def init_db() -> None:
         )
         """
     )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            idempotency_key TEXT UNIQUE,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at REAL NOT NULL,
+            locked_until REAL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at)")
+    # Bumped on every key create/revoke; workers poll it to drop cached key records
+    cur.execute("CREATE TABLE IF NOT EXISTS api_key_generation (id INTEGER PRIMARY KEY CHECK (id = 1), gen INTEGER NOT NULL)")
+    cur.execute("INSERT OR IGNORE INTO api_key_generation (id, gen) VALUES (1, 0)")
+    # HMAC replay nonces when DASH_HMAC_NONCE_BACKEND=sqlite
+    cur.execute("CREATE TABLE IF NOT EXISTS hmac_nonces (nonce TEXT PRIMARY KEY, expires_at REAL NOT NULL) WITHOUT ROWID")
+    cur.execute("CREATE INDEX IF NOT EXISTS hmac_nonces_expiry ON hmac_nonces (expires_at)")
     conn.commit()
-    conn.close()
 
 
 def create_api_key(key_id: str, secret_hash: str, scopes: Iterable[str], secret_enc: bytes | None = None) -> None:
-    conn = get_conn()
-    conn.execute(
-        "INSERT INTO api_keys (key_id, secret_hash, secret_enc, scopes, created_at) VALUES (?, ?, ?, ?, ?)",
-        (key_id, secret_hash, secret_enc, ",".join(sorted(set(scopes))), int(time.time())),
-    )
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        conn.execute(
+            "INSERT INTO api_keys (key_id, secret_hash, secret_enc, scopes, created_at) VALUES (?, ?, ?, ?, ?)",
+            (key_id, secret_hash, secret_enc, ",".join(sorted(set(scopes))), int(time.time())),
+        )
+        conn.execute("UPDATE api_key_generation SET gen = gen + 1 WHERE id = 1")
+        conn.commit()
 
 
 def list_api_keys(include_revoked: bool = False) -> list[dict]:
-    conn = get_conn()
-    cur = conn.cursor()
-    if include_revoked:
-        rows = cur.execute("SELECT * FROM api_keys ORDER BY created_at DESC").fetchall()
-    else:
-        rows = cur.execute("SELECT * FROM api_keys WHERE revoked_at IS NULL ORDER BY created_at DESC").fetchall()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        if include_revoked:
+            rows = cur.execute("SELECT * FROM api_keys ORDER BY created_at DESC").fetchall()
+        else:
+            rows = cur.execute("SELECT * FROM api_keys WHERE revoked_at IS NULL ORDER BY created_at DESC").fetchall()
     return [dict(r) for r in rows]
 
 
 def revoke_api_key(key_id: str) -> bool:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE api_keys SET revoked_at=? WHERE key_id=? AND revoked_at IS NULL", (int(time.time()), key_id))
-    conn.commit()
-    changed = cur.rowcount > 0
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE api_keys SET revoked_at=? WHERE key_id=? AND revoked_at IS NULL", (int(time.time()), key_id))
+        changed = cur.rowcount > 0
+        if changed:
+            cur.execute("UPDATE api_key_generation SET gen = gen + 1 WHERE id = 1")
+        conn.commit()
     return changed
 
 
 def lookup_api_key(key_id: str) -> Optional[dict]:
-    conn = get_conn()
-    row = conn.execute("SELECT * FROM api_keys WHERE key_id=? AND revoked_at IS NULL", (key_id,)).fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM api_keys WHERE key_id=? AND revoked_at IS NULL", (key_id,)).fetchone()
     return dict(row) if row else None
+
+
+def api_key_generation() -> int:
+    with connection() as conn:
+        row = conn.execute("SELECT gen FROM api_key_generation WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def remember_nonce(nonce: str, expires_at: float, prune_before: Optional[float] = None) -> tuple[bool, int]:
+    # (False if the nonce was already recorded, rows pruned)
+    with connection() as conn:
+        removed = 0
+        if prune_before is not None:
+            removed = conn.execute("DELETE FROM hmac_nonces WHERE expires_at<?", (prune_before,)).rowcount
+        fresh = conn.execute("INSERT OR IGNORE INTO hmac_nonces (nonce, expires_at) VALUES (?, ?)", (nonce, expires_at)).rowcount == 1
+        conn.commit()
+    return fresh, removed
+
+
+def nonce_count() -> int:
+    with connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM hmac_nonces").fetchone()[0]
+
+
+# Durable job queue. Status moves queued -> running -> done | failed (or back to
+# queued with a later run_at on a retryable error). A running job whose lease
+# lapses (worker died) is claimable again.
+
+JOB_COLUMNS = "id, kind, payload, status, attempts, max_attempts, run_at, result, error, created_at, updated_at"
+
+
+def _job(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+def enqueue_job(kind: str, payload: dict, run_at: Optional[float] = None, idempotency_key: Optional[str] = None, max_attempts: int = 5) -> tuple[dict, bool]:
+    """Insert a job, or return the existing one for the same idempotency key. Returns (job, created)."""
+    now = time.time()
+    with connection() as conn:
+        cur = conn.execute(
+            "INSERT INTO jobs (id, kind, payload, status, idempotency_key, max_attempts, run_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+            (uuid.uuid4().hex, kind, json.dumps(payload), idempotency_key, max_attempts, run_at or now, now, now),
+        )
+        created = cur.rowcount > 0
+        conn.commit()
+        if idempotency_key is not None:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE idempotency_key=?", (idempotency_key,)).fetchone()
+        else:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE rowid=?", (cur.lastrowid,)).fetchone()
+    return _job(row), created
+
+
+def claim_job(lease: float) -> Optional[dict]:
+    # One statement, so concurrent workers (threads or processes) never claim the same job
+    now = time.time()
+    with connection() as conn:
+        row = conn.execute(
+            f"""
+            UPDATE jobs SET status='running', attempts=attempts+1, locked_until=?, updated_at=?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status='queued' AND run_at<=?) OR (status='running' AND locked_until<?)
+                ORDER BY run_at LIMIT 1
+            )
+            RETURNING {JOB_COLUMNS}
+            """,
+            (now + lease, now, now, now),
+        ).fetchone()
+        conn.commit()
+    return _job(row)
+
+
+def finish_job(job_id: str, result: Any) -> None:
+    with connection() as conn:
+        conn.execute(
+            "UPDATE jobs SET status='done', result=?, error=NULL, locked_until=NULL, updated_at=? WHERE id=?",
+            (json.dumps(result), time.time(), job_id),
+        )
+        conn.commit()
+
+
+def fail_job(job_id: str, error: str, retry_at: Optional[float] = None) -> None:
+    # retry_at set: back to the queue; otherwise the job is dead
+    with connection() as conn:
+        if retry_at is not None:
+            conn.execute(
+                "UPDATE jobs SET status='queued', error=?, run_at=?, locked_until=NULL, updated_at=? WHERE id=?",
+                (error, retry_at, time.time(), job_id),
+            )
+        else:
+            conn.execute("UPDATE jobs SET status='failed', error=?, locked_until=NULL, updated_at=? WHERE id=?", (error, time.time(), job_id))
+        conn.commit()
+
+
+def cancel_job(job_id: str) -> bool:
+    with connection() as conn:
+        cur = conn.execute("UPDATE jobs SET status='cancelled', updated_at=? WHERE id=? AND status='queued'", (time.time(), job_id))
+        conn.commit()
+        changed = cur.rowcount > 0
+    return changed
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with connection() as conn:
+        row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id=?", (job_id,)).fetchone()
+    return _job(row)
+
+
+def next_job_at() -> Optional[float]:
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT MIN(CASE WHEN status='queued' THEN run_at ELSE locked_until END) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()
+    return row[0] if row else None
+
+
+def prune_jobs(older_than: float) -> int:
+    with connection() as conn:
+        cur = conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated_at<?", (older_than,))
+        conn.commit()
+        n = cur.rowcount
+    return n
+
+
+def job_counts() -> dict[str, int]:
+    with connection() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    return {r[0]: r[1] for r in rows}
@@ -2,10 +2,22 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.openapi.utils import get_openapi
 
-from ...security.auth import require_session
+from ...security.auth import require_session, verified_cookies
+from ...security.hmac import key_cache, nonces
+from ...security.rate_limit import limiter
+from ... import db
+from ..reddit.cache import response_cache as reddit_cache
+from ..reddit.clients import registry as reddit_clients
+from ..reddit.jobs import worker as reddit_jobs
+from ..reddit.modlog import syncer as reddit_modlog
+from ..reddit.poller import poller as reddit_poller
+from ..reddit.rss import rss as reddit_rss
+from ..reddit.scheduler import scheduler as reddit_scheduler
+from ..reddit.store import store as reddit_store
+from ..reddit.services import singleflight as reddit_flight
 
 
 router = APIRouter(prefix="/ops", tags=["ops"])  # under /api/v1
@@ -72,3 +84,44 @@ def generate_openapi(
         schema["openapi"] = version
     return schema
 
+
+@router.get("/db")
+def db_stats(sess=Depends(require_session)):
+    return {"pool": db.pool().stats()}
+
+
+@router.get("/auth")
+def auth_stats(sess=Depends(require_session)):
+    return {
+        "sessions": verified_cookies.stats(),
+        "api_keys": key_cache.stats(),
+        "nonces": nonces.stats(),
+        "rate_limit": limiter.stats(),
+    }
+
+
+@router.get("/reddit")
+def reddit_stats(sess=Depends(require_session)):
+    return {
+        "clients": reddit_clients.stats(),
+        "cache": reddit_cache.stats(),
+        "singleflight": reddit_flight.stats(),
+        "budgets": reddit_scheduler.stats(),
+        "poller": reddit_poller.stats(),
+        "rss": reddit_rss.stats(),
+        "store": reddit_store.stats(),
+        "modlog_sync": reddit_modlog.stats(),
+        "jobs": reddit_jobs.stats(),
+    }
+
+
+@router.post("/reddit/clients/invalidate")
+def reddit_invalidate(profile: Optional[str] = Query(None), sess=Depends(require_session)):
+    # Drop pooled PRAW clients (all profiles when none given) after rotating creds
+    return {"invalidated": reddit_clients.invalidate(profile)}
+
+
+@router.post("/reddit/cache/clear")
+def reddit_cache_clear(sess=Depends(require_session)):
+    reddit_cache.clear()
+    return {"ok": True}
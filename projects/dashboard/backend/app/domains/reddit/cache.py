@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+# pip install orjson
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Optional, Union
+
+import orjson
+
+from ... import db
+from ...settings import get_settings
+
+
+Tags = Union[Iterable[str], Callable[[Any], Iterable[str]]]
+
+
+@dataclass
+class CacheEntry:
+    __slots__ = ("value", "size", "expires", "stale_until", "tags", "checked")
+
+    value: Any
+    size: int
+    expires: float
+    stale_until: float
+    tags: frozenset
+    checked: float
+
+
+class LRUTier:
+    """In-process LRU bounded by the serialized size of its values.
+
+    Locked because PRAW worker threads write through ``ResponseCache.put`` while
+    the event loop reads and invalidates.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            e = self._data.get(key)
+            if e is not None:
+                self._data.move_to_end(key)
+            return e
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._data[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes and self._data:
+                _, ev = self._data.popitem(last=False)
+                self.bytes -= ev.size
+                self.evictions += 1
+
+    def invalidate(self, tags: set[str]) -> int:
+        with self._lock:
+            doomed = [k for k, e in self._data.items() if e.tags & tags]
+            for k in doomed:
+                self.bytes -= self._data.pop(k).size
+            return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteTier:
+    """Shared tier so every gunicorn worker sees the same entries and invalidations.
+
+    Methods block on SQLite; ``ResponseCache`` calls them through ``db.run``
+    (or from a worker thread already), never on the event loop.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS reddit_cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires REAL NOT NULL,
+                stale_until REAL NOT NULL,
+                tags TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE TABLE IF NOT EXISTS reddit_cache_tags (
+                tag TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (tag, key)
+            );
+            """
+        )
+        if "tags" not in {r[1] for r in conn.execute("PRAGMA table_info(reddit_cache)")}:
+            conn.execute("ALTER TABLE reddit_cache ADD COLUMN tags TEXT NOT NULL DEFAULT '[]'")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[tuple[bytes, float, float, frozenset]]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[bytes, float, float, frozenset]]:
+        conn = self._conn()
+        now = time.time()
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, value, expires, stale_until, tags FROM reddit_cache WHERE key IN ({','.join('?' * len(chunk))}) AND stale_until>?",
+                (*chunk, now),
+            )
+            for key, blob, expires, stale_until, tags in rows:
+                found[key] = (blob, expires, stale_until, frozenset(orjson.loads(tags)))
+        return found
+
+    def set(self, key: str, blob: bytes, expires: float, stale_until: float, tags: Iterable[str]) -> None:
+        conn = self._conn()
+        tags = sorted(tags)
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute(
+                "INSERT OR REPLACE INTO reddit_cache (key, value, expires, stale_until, tags) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, expires, stale_until, orjson.dumps(tags).decode()),
+            )
+            conn.executemany("INSERT OR IGNORE INTO reddit_cache_tags (tag, key) VALUES (?, ?)", [(t, key) for t in tags])
+
+    def invalidate(self, tags: set[str]) -> None:
+        conn = self._conn()
+        marks = ",".join("?" * len(tags))
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute(f"DELETE FROM reddit_cache WHERE key IN (SELECT key FROM reddit_cache_tags WHERE tag IN ({marks}))", tuple(tags))
+            conn.execute(f"DELETE FROM reddit_cache_tags WHERE tag IN ({marks})", tuple(tags))
+            # Opportunistic sweep of fully expired rows
+            conn.execute("DELETE FROM reddit_cache WHERE stale_until<?", (time.time(),))
+
+    def clear(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM reddit_cache")
+            conn.execute("DELETE FROM reddit_cache_tags")
+
+
+class ResponseCache:
+    """TTL cache with stale-while-revalidate, in-flight coalescing and tag invalidation.
+
+    Entries are fresh until ``ttl`` and may be served stale for a further ``swr``
+    seconds while a single background task refreshes them. With a shared tier,
+    local entries are re-checked against it every ``l1_max_age`` seconds so
+    invalidations from other workers land within that bound.
+    """
+
+    def __init__(self, l1: LRUTier, l2: Optional[SQLiteTier] = None, l1_max_age: float = 2.0):
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_max_age = l1_max_age
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._refreshing: set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float, swr: float = 0.0, tags: Tags = ()) -> Any:
+        now = time.time()
+        entry = await self._lookup(key, now)
+        if entry is not None:
+            if now < entry.expires:
+                self.hits += 1
+                return entry.value
+            self.stale_hits += 1
+            if key not in self._inflight:
+                task = self._start(key, fetch, ttl, swr, tags)
+                self._refreshing.add(task)
+                task.add_done_callback(self._refresh_done)
+            return entry.value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start(key, fetch, ttl, swr, tags)
+        return await asyncio.shield(task)
+
+    async def peek_many(self, keys: list[str]) -> dict[str, Any]:
+        # Fresh values only; never fetches. L1 misses go to the shared tier in one query.
+        now = time.time()
+        found: dict[str, Any] = {}
+        remote = []
+        for key in keys:
+            entry = self._local(key, now)
+            if entry is not None:
+                if now < entry.expires:
+                    found[key] = entry.value
+            elif self.l2 is not None:
+                remote.append(key)
+        if remote:
+            for key, row in (await db.run(self.l2.get_many, remote)).items():
+                entry = self._promote(key, row, now)
+                if now < entry.expires:
+                    found[key] = entry.value
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key: str, value: Any, ttl: float, swr: float = 0.0, tags: Tags = ()) -> None:
+        # Called from PRAW worker threads, so the shared-tier write happens inline
+        entry, blob = self._store_local(key, value, ttl, swr, tags)
+        if self.l2 is not None:
+            self.l2.set(key, blob, entry.expires, entry.stale_until, entry.tags)
+
+    def _local(self, key: str, now: float) -> Optional[CacheEntry]:
+        entry = self.l1.get(key)
+        if entry is not None and self.l2 is not None and now - entry.checked > self.l1_max_age:
+            entry = None
+        if entry is not None and now < entry.stale_until:
+            return entry
+        return None
+
+    def _promote(self, key: str, row: tuple, now: float) -> CacheEntry:
+        blob, expires, stale_until, tags = row
+        entry = CacheEntry(orjson.loads(blob), len(blob), expires, stale_until, tags, now)
+        self.l1.set(key, entry)
+        return entry
+
+    async def _lookup(self, key: str, now: float) -> Optional[CacheEntry]:
+        entry = self._local(key, now)
+        if entry is not None or self.l2 is None:
+            return entry
+        row = await db.run(self.l2.get, key)
+        return self._promote(key, row, now) if row is not None else None
+
+    def _start(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float, swr: float, tags: Tags) -> asyncio.Task:
+        async def run():
+            try:
+                value = await fetch()
+            except BaseException:
+                self.errors += 1
+                raise
+            finally:
+                self._inflight.pop(key, None)
+            entry, blob = self._store_local(key, value, ttl, swr, tags)
+            if self.l2 is not None:
+                await db.run(self.l2.set, key, blob, entry.expires, entry.stale_until, entry.tags)
+            return value
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return task
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refreshing.discard(task)
+        self.refreshes += 1
+        if not task.cancelled():
+            task.exception()  # mark retrieved; stale value stays until it lapses
+
+    def _store_local(self, key: str, value: Any, ttl: float, swr: float, tags: Tags) -> tuple[CacheEntry, bytes]:
+        now = time.time()
+        tag_set = frozenset(t for t in (tags(value) if callable(tags) else tags) if t)
+        blob = orjson.dumps(value)
+        entry = CacheEntry(value, len(blob), now + ttl, now + ttl + swr, tag_set, now)
+        self.l1.set(key, entry)
+        return entry, blob
+
+    async def invalidate(self, *tags: Optional[str]) -> int:
+        wanted = {t for t in tags if t}
+        if not wanted:
+            return 0
+        n = self.l1.invalidate(wanted)
+        if self.l2 is not None:
+            await db.run(self.l2.invalidate, wanted)
+        self.invalidations += 1
+        return n
+
+    def clear(self) -> None:
+        self.l1.clear()
+        if self.l2 is not None:
+            self.l2.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "entries": len(self.l1),
+            "bytes": self.l1.bytes,
+            "max_bytes": self.l1.max_bytes,
+            "evictions": self.l1.evictions,
+            "shared": self.l2 is not None,
+        }
+
+
+def sub_tag(sub: Optional[str]) -> Optional[str]:
+    return f"sub:{sub.lower()}" if sub else None
+
+
+def thing_tag(fullname: Optional[str]) -> Optional[str]:
+    return f"thing:{fullname}" if fullname else None
+
+
+def _build() -> ResponseCache:
+    s = get_settings()
+    l2 = SQLiteTier(s.reddit_cache_path) if s.reddit_cache_path else None
+    return ResponseCache(LRUTier(s.reddit_cache_max_mb * 1024 * 1024), l2)
+
+
+response_cache = _build()
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+# pip install praw
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import praw
+
+
+# Refresh OAuth access tokens this many seconds before Reddit expires them so a
+# request never pays for the token round-trip inline.
+TOKEN_REFRESH_MARGIN = 120.0
+
+
+def _profile_env(prefix: str) -> dict[str, str]:
+    up = prefix.upper()
+    return {
+        "client_id": os.environ.get(f"REDDIT_{up}_CLIENT_ID", ""),
+        "client_secret": os.environ.get(f"REDDIT_{up}_CLIENT_SECRET", ""),
+        "refresh_token": os.environ.get(f"REDDIT_{up}_REFRESH_TOKEN", ""),
+        "user_agent": os.environ.get(f"REDDIT_{up}_USER_AGENT", f"moonshit.dev/{up}") or f"moonshit.dev/{up}",
+        "username": os.environ.get(f"REDDIT_{up}_USERNAME", ""),
+        "password": os.environ.get(f"REDDIT_{up}_PASSWORD", ""),
+    }
+
+
+def _build(cfg: dict[str, str]) -> praw.Reddit:
+    if not cfg["client_id"] or not cfg["client_secret"]:
+        raise RuntimeError("Reddit client id/secret missing for profile")
+    if cfg["refresh_token"]:
+        return praw.Reddit(
+            client_id=cfg["client_id"],
+            client_secret=cfg["client_secret"],
+            refresh_token=cfg["refresh_token"],
+            user_agent=cfg["user_agent"],
+        )
+    if cfg["username"] and cfg["password"]:
+        return praw.Reddit(
+            client_id=cfg["client_id"],
+            client_secret=cfg["client_secret"],
+            username=cfg["username"],
+            password=cfg["password"],
+            user_agent=cfg["user_agent"],
+        )
+    raise RuntimeError("Reddit creds must provide either refresh token or username/password")
+
+
+def _authorizer(reddit: praw.Reddit):
+    core = getattr(reddit, "_core", None)
+    return getattr(core, "_authorizer", None)
+
+
+def _token_ttl(authz) -> Optional[float]:
+    # Seconds until the cached access token expires; None when no token is held.
+    if authz is None or getattr(authz, "access_token", None) is None:
+        return None
+    exp_ns = getattr(authz, "_expiration_timestamp_ns", None)
+    if exp_ns is not None:  # prawcore >= 3 (monotonic clock)
+        return (exp_ns - time.monotonic_ns()) / 1e9
+    exp = getattr(authz, "_expiration_timestamp", None)
+    if exp is not None:  # older prawcore (wall clock)
+        return exp - time.time()
+    return None
+
+
+@dataclass
+class _Entry:
+    fingerprint: tuple
+    reddit: praw.Reddit
+    created: float = field(default_factory=time.time)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ClientRegistry:
+    """Long-lived PRAW clients keyed by profile.
+
+    Each profile keeps one ``praw.Reddit`` so its requests session (keep-alive
+    connections) and OAuth access token survive across calls. Clients are rebuilt
+    when the profile's environment credentials change or on ``invalidate``.
+    """
+
+    def __init__(self, refresh_margin: float = TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.token_refreshes = 0
+        self.invalidations = 0
+
+    def get(self, profile: str) -> praw.Reddit:
+        key = profile.lower()
+        cfg = _profile_env(profile)
+        fp = tuple(sorted(cfg.items()))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.fingerprint != fp:
+                # Credentials rotated in the environment; drop the stale client
+                self._entries.pop(key, None)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                entry = self._entries[key] = _Entry(fingerprint=fp, reddit=_build(cfg))
+            else:
+                self.hits += 1
+        self._maybe_refresh(entry)
+        return entry.reddit
+
+    def peek(self, profile: str) -> Optional[praw.Reddit]:
+        # Existing client without touching counters, env or the network
+        entry = self._entries.get(profile.lower())
+        return entry.reddit if entry is not None else None
+
+    def _maybe_refresh(self, entry: _Entry) -> None:
+        authz = _authorizer(entry.reddit)
+        ttl = _token_ttl(authz)
+        if ttl is None or ttl > self.refresh_margin or not hasattr(authz, "refresh"):
+            # No token yet (prawcore fetches it on first request) or still fresh
+            return
+        if not entry.lock.acquire(blocking=False):
+            # Another thread is already refreshing; the current token is still valid
+            return
+        try:
+            ttl = _token_ttl(authz)
+            if ttl is not None and ttl <= self.refresh_margin:
+                authz.refresh()
+                self.token_refreshes += 1
+        finally:
+            entry.lock.release()
+
+    def invalidate(self, profile: Optional[str] = None) -> int:
+        with self._lock:
+            if profile is None:
+                n = len(self._entries)
+                self._entries.clear()
+            else:
+                n = 1 if self._entries.pop(profile.lower(), None) is not None else 0
+            self.invalidations += n
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = dict(self._entries)
+        profiles = {}
+        for name, e in entries.items():
+            ttl = _token_ttl(_authorizer(e.reddit))
+            profiles[name] = {"created": e.created, "token_ttl": round(ttl, 1) if ttl is not None else None}
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "token_refreshes": self.token_refreshes,
+            "invalidations": self.invalidations,
+            "profiles": profiles,
+        }
+
+
+registry = ClientRegistry()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+# pip install praw
+import asyncio
+import logging
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from praw.exceptions import RedditAPIException
+
+from ... import db
+from ...settings import get_settings
+from .scheduler import BULK, RateLimited, priority
+from .services import reddit_comment, reddit_submit, send_message
+
+
+log = logging.getLogger(__name__)
+
+# kind -> service; payload is the service's keyword arguments (including profile)
+JOB_KINDS: dict[str, Callable[..., Awaitable[Any]]] = {
+    "submit": reddit_submit,
+    "comment": reddit_comment,
+    "message": send_message,
+}
+
+LEASE = 300.0  # seconds a claimed job is held before another worker may retry it
+RETRY_BASE = 5.0
+RETRY_MAX = 900.0
+PRUNE_EVERY = 3600.0
+KEEP_FINISHED = 7 * 86400.0
+
+# Bad payloads; Reddit API errors other than RATELIMIT are permanent too (see _run)
+PERMANENT = (ValueError, TypeError)
+
+# Same pattern PRAW uses to read RATELIMIT messages ("... try again in 7 minutes.")
+_RATELIMIT_WAIT = re.compile(r"([0-9]+) (milliseconds?|seconds?|minutes?)")
+
+
+def _ratelimit_wait(e: RedditAPIException) -> Optional[float]:
+    """Seconds Reddit asked us to wait if ``e`` carries a RATELIMIT error, else None."""
+    for item in e.items:
+        if item.error_type != "RATELIMIT":
+            continue
+        m = _RATELIMIT_WAIT.search(item.message or "")
+        if m is None:
+            return 0.0  # no amount given; fall back to the usual backoff
+        n, unit = int(m.group(1)), m.group(2)
+        if unit.startswith("minute"):
+            return n * 60.0
+        if unit.startswith("millisecond"):
+            return n / 1000.0
+        return float(n)
+    return None
+
+
+class JobWorker:
+    """Runs queued Reddit writes from the ``jobs`` table with retries and backoff.
+
+    ``workers`` tasks claim due jobs one at a time. Enqueueing in this process
+    wakes them immediately; jobs queued by other processes or scheduled for
+    later are picked up within ``poll`` seconds.
+    """
+
+    def __init__(self, workers: int, poll: float = 5.0):
+        self.workers = workers
+        self.poll = poll
+        self._tasks: list[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._running: set[asyncio.Task] = set()
+        self._last_prune = 0.0
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def enqueue(self, kind: str, payload: dict, run_at: Optional[float] = None, idempotency_key: Optional[str] = None) -> tuple[dict, bool]:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"unknown job kind: {kind}")
+        key = f"{kind}:{idempotency_key}" if idempotency_key else None
+        job, created = await db.run(db.enqueue_job, kind, payload, run_at, key, get_settings().reddit_job_attempts)
+        if created and self._wake is not None:
+            self._wake.set()
+        return job, created
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._loop()) for _ in range(self.workers)]
+
+    async def stop(self, grace: float = 10.0) -> None:
+        # Let jobs already talking to Reddit finish; a cancelled one would be
+        # retried after its lease and could post twice
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._running:
+            await asyncio.wait(self._running, timeout=grace)
+
+    async def _loop(self) -> None:
+        priority.set(BULK)
+        while True:
+            job = await db.run(db.claim_job, LEASE)
+            if job is None:
+                await self._idle()
+                continue
+            # Shielded so stop() cancelling the loop does not abort a write mid-flight
+            run = asyncio.ensure_future(self._run(job))
+            self._running.add(run)
+            run.add_done_callback(self._running.discard)
+            await asyncio.shield(run)
+
+    async def _idle(self) -> None:
+        now = time.time()
+        if now - self._last_prune > PRUNE_EVERY:
+            self._last_prune = now
+            await db.run(db.prune_jobs, now - KEEP_FINISHED)
+        due = await db.run(db.next_job_at)
+        wait = self.poll if due is None else min(self.poll, max(0.0, due - now))
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, job: dict) -> None:
+        handler = JOB_KINDS.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"unknown job kind: {job['kind']}")
+            result = await handler(**job["payload"])
+        except RateLimited as e:
+            await self._retry(job, str(e), e.retry_after)
+        except RedditAPIException as e:
+            # PRAW only sleeps out RATELIMIT waits up to ratelimit_seconds; longer
+            # ones surface here and are retried once Reddit allows. Anything else
+            # (bad subreddit, too long, ...) is the request itself: retrying cannot help
+            wait = _ratelimit_wait(e)
+            if wait is not None:
+                await self._retry(job, str(e), wait)
+            else:
+                self.failed += 1
+                await db.run(db.fail_job, job["id"], str(e))
+        except PERMANENT as e:
+            self.failed += 1
+            await db.run(db.fail_job, job["id"], str(e) or e.__class__.__name__)
+        except Exception as e:
+            await self._retry(job, str(e) or e.__class__.__name__)
+        else:
+            self.done += 1
+            await db.run(db.finish_job, job["id"], result)
+
+    async def _retry(self, job: dict, error: str, at_least: float = 0.0) -> None:
+        if job["attempts"] >= job["max_attempts"]:
+            self.failed += 1
+            await db.run(db.fail_job, job["id"], error)
+            return
+        self.retried += 1
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** (job["attempts"] - 1)) * random.uniform(0.8, 1.2)
+        await db.run(db.fail_job, job["id"], error, time.time() + max(delay, at_least))
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "running": len(self._running),
+            "done": self.done,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queue": db.job_counts(),
+        }
+
+
+worker = JobWorker(get_settings().reddit_job_workers)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from ...settings import get_settings
+from .scheduler import BULK, priority
+from .services import modlog_sync
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class _Sync:
+    profile: str
+    sub: str
+    task: Optional[asyncio.Task] = None
+    runs: int = 0
+    fetched: int = 0
+    errors: int = 0
+    last_run: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class ModlogSyncer:
+    """Background incremental mod log sync for the subreddits in ``DASH_REDDIT_MODLOG_SYNC``."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._syncs: dict[tuple[str, str], _Sync] = {}
+
+    def start(self, profile: str, sub: str) -> None:
+        key = (profile.lower(), sub.lower())
+        s = self._syncs.get(key)
+        if s is None:
+            s = self._syncs[key] = _Sync(*key)
+        if s.task is None or s.task.done():
+            s.task = asyncio.ensure_future(self._loop(s))
+
+    def start_configured(self, spec: str) -> None:
+        # "profile:sub,profile:othersub"
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            profile, _, sub = part.partition(":")
+            if not profile or not sub:
+                log.warning("ignoring modlog sync %r: expected profile:sub", part)
+                continue
+            self.start(profile, sub)
+
+    async def _loop(self, s: _Sync) -> None:
+        priority.set(BULK)  # background work yields to interactive reads
+        backoff = self.interval
+        while True:
+            try:
+                res = await modlog_sync(s.profile, s.sub)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                s.errors += 1
+                s.last_error = str(e) or e.__class__.__name__
+                log.warning("modlog sync %s/%s failed: %s", s.profile, s.sub, e)
+                backoff = min(backoff * 2, 10 * self.interval)
+                await asyncio.sleep(backoff)
+                continue
+            backoff = self.interval
+            s.runs += 1
+            s.fetched += res["fetched"]
+            s.last_run = time.time()
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        tasks = [s.task for s in self._syncs.values() if s.task is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._syncs.clear()
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "profile": s.profile,
+                "sub": s.sub,
+                "runs": s.runs,
+                "fetched": s.fetched,
+                "errors": s.errors,
+                "last_run": s.last_run,
+                "last_error": s.last_error,
+            }
+            for s in self._syncs.values()
+        ]
+
+
+syncer = ModlogSyncer(get_settings().reddit_modlog_seconds)
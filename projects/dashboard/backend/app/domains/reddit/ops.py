@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+# pip install pydantic
+import asyncio
+import inspect
+import typing
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+
+from ...settings import get_settings
+from . import services as s
+from .scheduler import RateLimited
+
+
+Scope = Literal["read", "write"]
+
+
+class UnknownOperation(LookupError):
+    pass
+
+
+class OperationForbidden(PermissionError):
+    pass
+
+
+@dataclass(frozen=True)
+class OpSpec:
+    """One proxy operation as declared: the service it calls and how.
+
+    Parameters are taken from the handler's signature (minus ``profile``);
+    ``fixed`` pins arguments the caller may not set and ``fields`` overrides
+    individual field types/constraints.
+    """
+
+    name: str
+    handler: Callable[..., Awaitable[Any]]
+    scope: Scope = "read"
+    summary: str = ""
+    fixed: dict[str, Any] = field(default_factory=dict)
+    fields: dict[str, tuple[Any, Any]] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Op:
+    name: str
+    handler: Callable[..., Awaitable[Any]]
+    scope: Scope
+    params: type[BaseModel]
+    fixed: dict[str, Any]
+    schema: dict
+
+
+def _limit(default: int, le: int = 100):
+    return (int, Field(default, ge=1, le=le))
+
+
+def _listing(sort: str) -> OpSpec:
+    return OpSpec(
+        f"listing.{sort}",
+        s.reddit_listing,
+        summary=f"{sort.capitalize()} posts in a subreddit",
+        fixed={"sort": sort, "modonly": False},
+        fields={"sub": (str, ...), "limit": _limit(25), "after": (Optional[str], None)},
+    )
+
+
+SPECS: list[OpSpec] = [
+    OpSpec("account.me", s.reddit_me, summary="Authenticated account"),
+    OpSpec(
+        "account.subs",
+        s.reddit_listing,
+        summary="Subscribed (or moderated) subreddits",
+        fixed={"sub": None, "sort": "subs", "time_filter": None, "before": None},
+        fields={"limit": _limit(25), "after": (Optional[str], None)},
+    ),
+    OpSpec("subreddit.about", s.subreddit_about, summary="Subreddit metadata"),
+    OpSpec("subreddit.rules", s.subreddit_rules, summary="Subreddit rule names"),
+    OpSpec("subreddit.wiki", s.subreddit_wiki, summary="Wiki page markdown"),
+    *(_listing(sort) for sort in ("new", "hot", "top", "rising", "controversial")),
+    OpSpec("search.posts", s.reddit_search, summary="Lucene search within a subreddit (default all)"),
+    OpSpec(
+        "comments.tree",
+        s.reddit_comments,
+        summary="Flat depth-first comment nodes with more-tokens",
+        fields={"max_depth": (int, Field(10, ge=0, le=100)), "max_comments": (int, Field(1000, ge=1, le=20000))},
+    ),
+    OpSpec(
+        "comments.more",
+        s.reddit_more_comments,
+        summary="Expand a more-token",
+        fields={
+            "children": (list[str], []),
+            "parent": (Optional[str], None),
+            "depth": (int, Field(0, ge=0)),
+            "max_depth": (int, Field(10, ge=0, le=100)),
+            "max_comments": (int, Field(1000, ge=1, le=20000)),
+        },
+    ),
+    OpSpec("things.info", s.reddit_things, summary="Resolve t1_/t3_ fullnames", fields={"ids": (list[str], Field(..., max_length=1000))}),
+    OpSpec(
+        "mod.queue",
+        s.modqueue_list,
+        summary="Mod queue page (modqueue/reports/spam/edited/unmoderated/modlog)",
+        fields={
+            "queue": (Literal["modqueue", "reports", "spam", "edited", "unmoderated", "modlog"], ...),
+            "limit": _limit(50),
+        },
+    ),
+    OpSpec("inbox.list", s.inbox_list, summary="Inbox page", fields={"type": (Literal["all", "unread"], "all"), "after": (Optional[str], None), "limit": _limit(25)}),
+    # Writes
+    OpSpec("content.submit", s.reddit_submit, "write", summary="Submit a post"),
+    OpSpec("content.comment", s.reddit_comment, "write", summary="Reply to a post or comment"),
+    OpSpec("content.edit", s.reddit_edit, "write", summary="Edit own post or comment"),
+    OpSpec("content.delete", s.reddit_delete, "write", summary="Delete own post or comment"),
+    OpSpec("content.vote", s.reddit_vote, "write", summary="Vote (-1, 0, 1)", fields={"dir": (Literal[-1, 0, 1], ...)}),
+    OpSpec("content.save", s.reddit_save, "write", summary="Save a thing"),
+    OpSpec("content.unsave", s.reddit_unsave, "write", summary="Unsave a thing"),
+    OpSpec("mod.approve", s.mod_approve, "write", summary="Approve"),
+    OpSpec("mod.remove", s.mod_remove, "write", summary="Remove (optionally as spam)", fields={"spam": (bool, False)}),
+    OpSpec("mod.lock", s.mod_lock, "write", summary="Lock"),
+    OpSpec("mod.unlock", s.mod_unlock, "write", summary="Unlock"),
+    OpSpec("mod.sticky", s.mod_sticky, "write", summary="Sticky or unsticky a post"),
+    OpSpec("mod.distinguish", s.mod_distinguish, "write", summary="Distinguish"),
+    OpSpec("mod.ban", s.mod_ban, "write", summary="Ban a user", fields={"reason": (Optional[str], None), "days": (Optional[int], Field(None, ge=1, le=999))}),
+    OpSpec("mod.unban", s.mod_unban, "write", summary="Unban a user"),
+    OpSpec("mod.suggested_sort", s.set_suggested_sort, "write", summary="Set a post's suggested comment sort"),
+    OpSpec("flair.user", s.flair_user, "write", summary="Set user flair", fields={"flair_text": (Optional[str], None), "flair_template_id": (Optional[str], None)}),
+    OpSpec("flair.link", s.flair_link, "write", summary="Set post flair", fields={"flair_text": (Optional[str], None), "flair_template_id": (Optional[str], None)}),
+    OpSpec("inbox.send", s.send_message, "write", summary="Send a private message"),
+]
+
+
+def _compile(spec: OpSpec) -> Op:
+    hints = typing.get_type_hints(spec.handler)
+    fields: dict[str, tuple[Any, Any]] = {}
+    for name, p in inspect.signature(spec.handler).parameters.items():
+        if name == "profile" or name in spec.fixed:
+            continue
+        if name in spec.fields:
+            fields[name] = spec.fields[name]
+        else:
+            fields[name] = (hints.get(name, Any), ... if p.default is inspect.Parameter.empty else p.default)
+    unknown = set(spec.fields) - set(fields)
+    if unknown:
+        raise RuntimeError(f"{spec.name}: no such handler parameter(s) {sorted(unknown)}")
+    model_name = "".join(part.capitalize() for part in spec.name.replace("_", ".").split(".")) + "Params"
+    params = create_model(model_name, __config__=ConfigDict(extra="forbid"), **fields)
+    schema = {
+        "summary": spec.summary,
+        "scope": spec.scope,
+        "params": params.model_json_schema(),
+    }
+    return Op(spec.name, spec.handler, spec.scope, params, dict(spec.fixed), schema)
+
+
+# Compiled once at import: name -> Op, with validators and schemas prebuilt
+OPS: dict[str, Op] = {}
+for _spec in SPECS:
+    if _spec.name in OPS:
+        raise RuntimeError(f"duplicate proxy operation {_spec.name}")
+    OPS[_spec.name] = _compile(_spec)
+
+_REGISTRY = {
+    "namespaces": sorted({name.split(".", 1)[0] for name in OPS}),
+    "schemas": {name: op.schema for name, op in OPS.items()},
+}
+
+
+def ops_registry() -> dict:
+    return _REGISTRY
+
+
+def get_op(name: str) -> Op:
+    op = OPS.get(name)
+    if op is None:
+        raise UnknownOperation(f"Operation not allowlisted: {name}")
+    return op
+
+
+async def proxy_dispatch(profile: str, namespace: str, operation: str, params: Optional[dict], writable: bool = False) -> Any:
+    # Raises UnknownOperation, OperationForbidden, pydantic.ValidationError or the
+    # service's own errors. ``writable``: the caller holds reddit:write
+    op = get_op(f"{namespace}.{operation}")
+    if op.scope == "write" and not writable:
+        raise OperationForbidden(f"Operation {op.name} requires reddit:write")
+    args = op.params.model_validate(params or {})
+    return await op.handler(profile, **dict(args), **op.fixed)
+
+
+# Process-wide cap on proxy calls in flight from batches, across all requests
+_batch_gate = asyncio.Semaphore(get_settings().reddit_proxy_concurrency)
+
+
+async def _batch_entry(profile: str, index: int, entry: dict, timeout: float, writable: bool) -> dict:
+    profile = entry.get("profile") or profile
+    head = {"index": index, "profile": profile, "op": f"{entry.get('namespace')}.{entry.get('operation')}"}
+    try:
+        async with _batch_gate:
+            result = await asyncio.wait_for(
+                proxy_dispatch(profile, entry.get("namespace"), entry.get("operation"), entry.get("params"), writable), timeout
+            )
+        return {**head, "ok": True, "result": result}
+    except UnknownOperation as e:
+        return {**head, "ok": False, "status": 404, "error": str(e)}
+    except OperationForbidden as e:
+        return {**head, "ok": False, "status": 403, "error": str(e)}
+    except ValidationError as e:
+        return {**head, "ok": False, "status": 422, "error": e.errors(include_url=False, include_context=False)}
+    except RateLimited as e:
+        return {**head, "ok": False, "status": 429, "error": str(e), "retry_after": round(e.retry_after, 1)}
+    except asyncio.TimeoutError:
+        return {**head, "ok": False, "status": 504, "error": f"timed out after {timeout:g}s"}
+    except ValueError as e:
+        return {**head, "ok": False, "status": 400, "error": str(e)}
+    except Exception as e:
+        return {**head, "ok": False, "status": 502, "error": str(e) or e.__class__.__name__}
+
+
+async def proxy_batch(profile: str, entries: list[dict], timeout: Optional[float] = None, writable: bool = False) -> list[dict]:
+    """Run proxy calls concurrently; results come back in request order."""
+    timeout = timeout or get_settings().reddit_proxy_timeout
+    return list(await asyncio.gather(*(_batch_entry(profile, i, e, timeout, writable) for i, e in enumerate(entries))))
+
+
+async def proxy_batch_stream(profile: str, entries: list[dict], timeout: Optional[float] = None, writable: bool = False) -> AsyncIterator[dict]:
+    """Like proxy_batch, but yield each result as it completes; ``index`` maps it back."""
+    timeout = timeout or get_settings().reddit_proxy_timeout
+    tasks = [asyncio.ensure_future(_batch_entry(profile, i, e, timeout, writable)) for i, e in enumerate(entries)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from ...settings import get_settings
+from .services import queue_items
+
+
+log = logging.getLogger(__name__)
+
+QUEUES = ("modqueue", "reports", "spam", "edited", "unmoderated", "modlog", "inbox")
+SUBSCRIBER_BUFFER = 64
+KEEPALIVE = 15.0  # seconds between pings on an idle subscription
+
+
+@dataclass(frozen=True)
+class WatchKey:
+    profile: str
+    sub: str  # "" for the inbox
+    queue: str
+
+
+@dataclass
+class _Watch:
+    key: WatchKey
+    pinned: bool = False
+    subscribers: set = field(default_factory=set)
+    snapshot: Optional[dict] = None  # item key -> item
+    task: Optional[asyncio.Task] = None
+    polls: int = 0
+    errors: int = 0
+    last_poll: Optional[float] = None
+
+
+def _item_key(item: dict) -> str:
+    return item.get("name") or item.get("id") or ""
+
+
+class QueuePoller:
+    """One upstream poll per (profile, sub, queue), fanned out to every subscriber.
+
+    Each watch polls at a fixed cadence, diffs the result against its previous
+    snapshot and pushes only the delta. Watches started by a subscriber stop
+    when the last one leaves; watches from ``DASH_REDDIT_WATCH`` run for the life
+    of the process.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._watches: dict[WatchKey, _Watch] = {}
+
+    def _watch(self, key: WatchKey, pinned: bool = False) -> _Watch:
+        w = self._watches.get(key)
+        if w is None:
+            w = self._watches[key] = _Watch(key, pinned=pinned)
+        w.pinned = w.pinned or pinned
+        if w.task is None or w.task.done():
+            w.task = asyncio.ensure_future(self._loop(w))
+        return w
+
+    async def subscribe(self, key: WatchKey) -> AsyncIterator[dict]:
+        w = self._watch(key)
+        q: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        w.subscribers.add(q)
+        try:
+            # Before the first successful poll the snapshot arrives through the
+            # queue, with pings and failed-poll errors until then
+            if w.snapshot is not None:
+                yield {"type": "snapshot", "items": list(w.snapshot.values())}
+            while True:
+                try:
+                    event = await asyncio.wait_for(q.get(), KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield {"type": "ping"}
+                    continue
+                if event is None:  # dropped for falling behind; client should reconnect
+                    yield {"type": "overflow"}
+                    return
+                yield event
+        finally:
+            w.subscribers.discard(q)
+            if not w.subscribers and not w.pinned and w.task is not None:
+                w.task.cancel()
+                self._watches.pop(key, None)
+
+    def _broadcast(self, w: _Watch, event: dict) -> None:
+        for q in list(w.subscribers):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                w.subscribers.discard(q)
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(None)
+
+    async def _loop(self, w: _Watch) -> None:
+        k = w.key
+        backoff = self.interval
+        while True:
+            try:
+                items = await queue_items(k.profile, k.sub or None, k.queue)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                w.errors += 1
+                log.warning("poll %s failed: %s", k, e)
+                backoff = min(backoff * 2, 10 * self.interval)
+                self._broadcast(w, {"type": "error", "error": str(e) or e.__class__.__name__, "retry_in": backoff})
+                await asyncio.sleep(backoff)
+                continue
+            backoff = self.interval
+            w.polls += 1
+            w.last_poll = time.time()
+            current = {_item_key(i): i for i in items}
+            if w.snapshot is None:
+                self._broadcast(w, {"type": "snapshot", "items": list(current.values())})
+            else:
+                added = [i for key, i in current.items() if key not in w.snapshot]
+                removed = [key for key in w.snapshot if key not in current]
+                if added or removed:
+                    self._broadcast(w, {"type": "delta", "added": added, "removed": removed})
+            w.snapshot = current
+            await asyncio.sleep(self.interval)
+
+    def start_configured(self, spec: str) -> None:
+        # "profile:sub:queue,profile::inbox"
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            profile, sub, queue = (part.split(":") + ["", ""])[:3]
+            if queue not in QUEUES:
+                log.warning("ignoring watch %r: unknown queue", part)
+                continue
+            self._watch(WatchKey(profile.lower(), sub.lower(), queue), pinned=True)
+
+    async def stop(self) -> None:
+        tasks = [w.task for w in self._watches.values() if w.task is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._watches.clear()
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "profile": w.key.profile,
+                "sub": w.key.sub,
+                "queue": w.key.queue,
+                "pinned": w.pinned,
+                "subscribers": len(w.subscribers),
+                "items": len(w.snapshot or {}),
+                "polls": w.polls,
+                "errors": w.errors,
+                "last_poll": w.last_poll,
+            }
+            for w in self._watches.values()
+        ]
+
+
+poller = QueuePoller(get_settings().reddit_poll_seconds)
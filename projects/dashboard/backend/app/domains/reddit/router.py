@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from typing import Optional
-
-from fastapi import APIRouter, Depends, HTTPException, Query
-
-from ...security.deps import require_user_or_hmac
+import asyncio
+import math
+import time
+from typing import AsyncIterator, Callable, List, Literal, Optional
+
+import orjson
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+
+from ...security.deps import has_scope, require_user_or_hmac
+from ... import db
+from .jobs import worker as job_worker
+from .ops import OperationForbidden, UnknownOperation, get_op as lookup_op, ops_registry, proxy_batch, proxy_batch_stream, proxy_dispatch
+from .poller import QUEUES, WatchKey, poller
+from .scheduler import RateLimited
 from .services import (
     reddit_me,
     reddit_listing,
@@ -13,8 +25,8 @@ from .services import (
     subreddit_wiki,
     reddit_search,
     reddit_comments,
-    reddit_submit,
-    reddit_comment,
+    reddit_comments_stream,
+    reddit_more_comments,
     reddit_edit,
     reddit_delete,
     reddit_vote,
@@ -28,213 +40,501 @@ from .services import (
     mod_distinguish,
     mod_ban,
     mod_unban,
+    mod_batch,
     flair_user,
     flair_link,
     set_suggested_sort,
     modqueue_list,
-    ops_registry,
-    proxy_dispatch,
+    modqueue_stream,
+    reddit_listing_stream,
+    inbox_stream,
+    reddit_things,
     inbox_list,
-    send_message,
+    modlog_stats,
+    modlog_sync,
+    stored_modlog,
+    stored_queue,
+    stored_things,
 )
 
 
+class CancelOnDisconnectRoute(APIRoute):
+    """Cancel the handler when the client disconnects mid-request.
+
+    The body is read up front so the watcher only ever sees the final
+    ``http.disconnect`` message; cancellation then propagates into the service
+    layer and releases the profile's concurrency slot.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            await request.body()
+            task = asyncio.ensure_future(handler(request))
+            watcher = asyncio.ensure_future(_wait_disconnect(request))
+            try:
+                await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                watcher.cancel()
+            if not task.done():
+                task.cancel()
+                # Nobody is listening; 499 mirrors nginx's "client closed request"
+                return Response(status_code=499)
+            try:
+                return task.result()
+            except RateLimited as e:
+                retry = max(1, math.ceil(e.retry_after))
+                return JSONResponse({"detail": str(e)}, status_code=429, headers={"Retry-After": str(retry)})
+
+        return route_handler
+
+
+async def _wait_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def ndjson(items: AsyncIterator[dict]) -> StreamingResponse:
+    async def body():
+        async for item in items:
+            yield orjson.dumps(item) + b"\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def sse(events: AsyncIterator[dict]) -> StreamingResponse:
+    async def body():
+        async for ev in events:
+            if ev["type"] == "ping":
+                yield b": ping\n\n"
+            else:
+                yield b"event: " + ev["type"].encode() + b"\ndata: " + orjson.dumps(ev) + b"\n\n"
+
+    # X-Accel-Buffering: nginx must not buffer the event stream
+    return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+STREAM_MAX = 1000  # Reddit stops paging listings around this depth
+
+
+async def paged(items: AsyncIterator[dict], limit: int) -> AsyncIterator[dict]:
+    # Pass items through, then a trailer carrying the cursor to resume from
+    count = 0
+    last = None
+    try:
+        async for item in items:
+            count += 1
+            last = item.get("name") or item.get("id")
+            yield item
+    except RateLimited as e:
+        # A later page was refused after the 200 went out; resume from "after" once retry_after passes
+        yield {"done": False, "count": count, "after": last, "error": str(e), "retry_after": max(1, math.ceil(e.retry_after))}
+        return
+    yield {"done": True, "count": count, "after": last if count >= limit else None}
+
+
+class ModBatchAction(BaseModel):
+    action: Literal["approve", "remove", "lock", "unlock", "sticky", "distinguish", "flair"]
+    thing_id: str
+    spam: bool = False
+    state: bool = True
+    how: Optional[str] = None
+    sub: Optional[str] = None
+    flair_text: Optional[str] = None
+    flair_template_id: Optional[str] = None
+
+
+class ProxyCall(BaseModel):
+    namespace: str
+    operation: str
+    params: dict = {}
+    profile: Optional[str] = None  # defaults to the path profile
+
+
 router = APIRouter(prefix="/reddit", tags=["reddit"])  # container
 read_dep = Depends(require_user_or_hmac(["reddit:read"]))
 write_dep = Depends(require_user_or_hmac(["reddit:write"]))
-read = APIRouter(dependencies=[read_dep])
-write = APIRouter(dependencies=[write_dep])
+read = APIRouter(dependencies=[read_dep], route_class=CancelOnDisconnectRoute)
+write = APIRouter(dependencies=[write_dep], route_class=CancelOnDisconnectRoute)
+
+
+# Proxy allowlist; registered before the /{profile}/... routes, which would
+# otherwise capture e.g. /ops/comments/tree as profile=ops, post_id=tree
+@read.get("/ops")
+async def list_ops():
+    return ops_registry()
+
+
+@read.get("/ops/{namespace}/{operation}")
+async def get_op(namespace: str, operation: str):
+    try:
+        return lookup_op(f"{namespace}.{operation}").schema
+    except UnknownOperation as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 
 @read.get("/{profile}/me")
-def get_me(profile: str):
-    return reddit_me(profile)
+async def get_me(profile: str):
+    return await reddit_me(profile)
 
 
 @read.get("/{profile}/subs")
-def get_subs(profile: str, modonly: bool = False, after: Optional[str] = None, limit: int = 25):
-    return reddit_listing(profile, sub=None, sort="subs", after=after, limit=limit, modonly=modonly)
+async def get_subs(profile: str, modonly: bool = False, after: Optional[str] = None, limit: int = 25):
+    return await reddit_listing(profile, sub=None, sort="subs", after=after, limit=limit, modonly=modonly)
 
 
 @read.get("/{profile}/r/{sub}/about")
-def get_sub_about(profile: str, sub: str):
-    return subreddit_about(profile, sub)
+async def get_sub_about(profile: str, sub: str):
+    return await subreddit_about(profile, sub)
 
 
 @read.get("/{profile}/r/{sub}/rules")
-def get_sub_rules(profile: str, sub: str):
-    return subreddit_rules(profile, sub)
+async def get_sub_rules(profile: str, sub: str):
+    return await subreddit_rules(profile, sub)
 
 
 @read.get("/{profile}/r/{sub}/wiki/{path}")
-def get_sub_wiki(profile: str, sub: str, path: str):
-    return subreddit_wiki(profile, sub, path)
-
-
-@read.get("/{profile}/r/{sub}/{sort}")
-def get_listing(profile: str, sub: str, sort: str, after: Optional[str] = None, limit: int = 25, t: Optional[str] = None):
-    return reddit_listing(profile, sub=sub, sort=sort, after=after, limit=limit, time_filter=t)
+async def get_sub_wiki(profile: str, sub: str, path: str):
+    return await subreddit_wiki(profile, sub, path)
 
 
 @read.get("/{profile}/search")
-def search(profile: str, q: str, sub: Optional[str] = None, type: Optional[str] = None):
-    return reddit_search(profile, q=q, sub=sub, type=type)
+async def search(profile: str, q: str, sub: Optional[str] = None, type: Optional[str] = None):
+    return await reddit_search(profile, q=q, sub=sub, type=type)
 
 
 @read.get("/{profile}/comments/{post_id}")
-def comments(profile: str, post_id: str):
-    return reddit_comments(profile, post_id)
-
-
-# Write
-@write.post("/{profile}/r/{sub}/submit")
-def submit(profile: str, sub: str, kind: str, title: str, text: Optional[str] = None, url: Optional[str] = None, nsfw: Optional[bool] = None, spoiler: Optional[bool] = None, flair: Optional[str] = None):
-    return reddit_submit(profile, sub=sub, kind=kind, title=title, text=text, url=url, nsfw=nsfw, spoiler=spoiler, flair=flair)
-
-
-@write.post("/{profile}/comment")
-def comment(profile: str, parent_id: str, text: str):
-    return reddit_comment(profile, parent_id=parent_id, text=text)
+async def comments(profile: str, post_id: str, max_depth: int = Query(10, ge=0, le=100), max_comments: int = Query(1000, ge=1, le=20000), stream: bool = False):
+    # Flat nodes carry parent_id/depth; "more" nodes are continuation tokens
+    if stream:
+        return ndjson(await reddit_comments_stream(profile, post_id, max_depth, max_comments))
+    return await reddit_comments(profile, post_id, max_depth, max_comments)
+
+
+@read.get("/{profile}/comments/{post_id}/more")
+async def more_comments(
+    profile: str,
+    post_id: str,
+    children: Optional[str] = None,
+    parent: Optional[str] = None,
+    depth: int = Query(0, ge=0),
+    max_depth: int = Query(10, ge=0, le=100),
+    max_comments: int = Query(1000, ge=1, le=20000),
+):
+    ids = [c for c in (children or "").split(",") if c]
+    if not ids and not parent:
+        raise HTTPException(status_code=400, detail="children or parent required")
+    return await reddit_more_comments(profile, post_id, ids, parent, depth, max_depth, max_comments)
+
+
+@read.get("/{profile}/things")
+async def things(profile: str, ids: str = Query(..., description="Comma-separated fullnames (t1_/t3_)")):
+    id_list = ids.split(",")
+    if len(id_list) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 ids per request")
+    try:
+        return await reddit_things(profile, id_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Local history store; refresh=true first pulls only what is newer than the store
+@read.get("/{profile}/store/r/{sub}/things")
+async def stored_things_list(
+    profile: str,
+    sub: str,
+    kind: Optional[Literal["t1", "t3"]] = None,
+    author: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    refresh: bool = False,
+):
+    return await stored_things(profile, sub, refresh, kind=kind, author=author, since=since, until=until, after=after, limit=limit)
+
+
+@read.get("/{profile}/store/r/{sub}/modlog")
+async def stored_modlog_list(
+    profile: str,
+    sub: str,
+    mod: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    refresh: bool = False,
+):
+    return await stored_modlog(profile, sub, refresh, mod=mod, action=action, since=since, until=until, after=after, limit=limit)
+
+
+@read.get("/{profile}/store/r/{sub}/modlog/stats")
+async def stored_modlog_stats(profile: str, sub: str, since: Optional[float] = None, until: Optional[float] = None, mod: Optional[str] = None, refresh: bool = False):
+    # Actions per moderator per hour (hour = epoch seconds of the hour start); defaults to the last week
+    until = until or time.time()
+    since = since if since is not None else until - 7 * 86400
+    return await modlog_stats(profile, sub, since, until, mod, refresh)
+
+
+@write.post("/{profile}/r/{sub}/mod/log/sync")
+async def sync_modlog(profile: str, sub: str):
+    return await modlog_sync(profile, sub)
+
+
+@read.get("/{profile}/store/r/{sub}/{queue}/history")
+async def stored_queue_history(profile: str, sub: str, queue: Literal["modqueue", "reports", "spam", "edited", "unmoderated"], since: Optional[float] = None, until: Optional[float] = None, refresh: bool = False):
+    # Defaults to the last week
+    until = until or time.time()
+    since = since if since is not None else until - 7 * 86400
+    return await stored_queue(profile, sub, queue, since, until, refresh)
+
+
+# Queued writes: 202 with the job; poll GET /reddit/jobs/{id} for the outcome.
+# run_at (epoch seconds) schedules; a repeated Idempotency-Key returns the original job.
+async def _enqueue(request: Request, kind: str, payload: dict, run_at: Optional[float], key: Optional[str]) -> JSONResponse:
+    job, created = await job_worker.enqueue(kind, payload, run_at, key)
+    location = request.url_for("get_job", job_id=job["id"]).path
+    return JSONResponse(job, status_code=202 if created else 200, headers={"Location": location})
+
+
+@write.post("/{profile}/r/{sub}/submit", status_code=202)
+async def submit(
+    request: Request,
+    profile: str,
+    sub: str,
+    kind: str,
+    title: str,
+    text: Optional[str] = None,
+    url: Optional[str] = None,
+    nsfw: Optional[bool] = None,
+    spoiler: Optional[bool] = None,
+    flair: Optional[str] = None,
+    run_at: Optional[float] = None,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    payload = {"profile": profile, "sub": sub, "kind": kind, "title": title, "text": text, "url": url, "nsfw": nsfw, "spoiler": spoiler, "flair": flair}
+    return await _enqueue(request, "submit", payload, run_at, idempotency_key)
+
+
+@write.post("/{profile}/comment", status_code=202)
+async def comment(request: Request, profile: str, parent_id: str, text: str, run_at: Optional[float] = None, idempotency_key: Optional[str] = Header(None, max_length=200)):
+    return await _enqueue(request, "comment", {"profile": profile, "parent_id": parent_id, "text": text}, run_at, idempotency_key)
 
 
 @write.post("/{profile}/edit")
-def edit(profile: str, thing_id: str, text: str):
-    return reddit_edit(profile, thing_id=thing_id, text=text)
+async def edit(profile: str, thing_id: str, text: str):
+    return await reddit_edit(profile, thing_id=thing_id, text=text)
 
 
 @write.post("/{profile}/delete")
-def delete(profile: str, thing_id: str):
-    return reddit_delete(profile, thing_id=thing_id)
+async def delete(profile: str, thing_id: str):
+    return await reddit_delete(profile, thing_id=thing_id)
 
 
 @write.post("/{profile}/vote")
-def vote(profile: str, thing_id: str, dir: int):
-    return reddit_vote(profile, thing_id=thing_id, dir=dir)
+async def vote(profile: str, thing_id: str, dir: int):
+    return await reddit_vote(profile, thing_id=thing_id, dir=dir)
 
 
 @write.post("/{profile}/save")
-def save(profile: str, thing_id: str):
-    return reddit_save(profile, thing_id)
+async def save(profile: str, thing_id: str):
+    return await reddit_save(profile, thing_id)
 
 
 @write.post("/{profile}/unsave")
-def unsave(profile: str, thing_id: str):
-    return reddit_unsave(profile, thing_id)
+async def unsave(profile: str, thing_id: str):
+    return await reddit_unsave(profile, thing_id)
 
 
 # Moderation queues
+async def _queue(profile: str, sub: str, queue: str, after: Optional[str], limit: int, stream: bool):
+    if stream:
+        limit = min(limit, STREAM_MAX)
+        return ndjson(paged(await modqueue_stream(profile, sub, queue, after, limit), limit))
+    return await modqueue_list(profile, sub, queue=queue, after=after, limit=limit)
+
+
 @read.get("/{profile}/r/{sub}/modqueue")
-def modqueue(profile: str, sub: str):
-    return modqueue_list(profile, sub, queue="modqueue")
+async def modqueue(profile: str, sub: str, after: Optional[str] = None, limit: int = 50, stream: bool = False):
+    return await _queue(profile, sub, "modqueue", after, limit, stream)
 
 
 @read.get("/{profile}/r/{sub}/reports")
-def reports(profile: str, sub: str):
-    return modqueue_list(profile, sub, queue="reports")
+async def reports(profile: str, sub: str, after: Optional[str] = None, limit: int = 50, stream: bool = False):
+    return await _queue(profile, sub, "reports", after, limit, stream)
 
 
 @read.get("/{profile}/r/{sub}/spam")
-def spam(profile: str, sub: str):
-    return modqueue_list(profile, sub, queue="spam")
+async def spam(profile: str, sub: str, after: Optional[str] = None, limit: int = 50, stream: bool = False):
+    return await _queue(profile, sub, "spam", after, limit, stream)
 
 
 @read.get("/{profile}/r/{sub}/edited")
-def edited(profile: str, sub: str):
-    return modqueue_list(profile, sub, queue="edited")
+async def edited(profile: str, sub: str, after: Optional[str] = None, limit: int = 50, stream: bool = False):
+    return await _queue(profile, sub, "edited", after, limit, stream)
 
 
 @read.get("/{profile}/r/{sub}/unmoderated")
-def unmoderated(profile: str, sub: str):
-    return modqueue_list(profile, sub, queue="unmoderated")
+async def unmoderated(profile: str, sub: str, after: Optional[str] = None, limit: int = 50, stream: bool = False):
+    return await _queue(profile, sub, "unmoderated", after, limit, stream)
 
 
 @read.get("/{profile}/r/{sub}/mod/log")
-def modlog(profile: str, sub: str):
-    return modqueue_list(profile, sub, queue="modlog")
+async def modlog(profile: str, sub: str, after: Optional[str] = None, limit: int = 50, stream: bool = False):
+    return await _queue(profile, sub, "modlog", after, limit, stream)
+
+
+@read.get("/{profile}/r/{sub}/{queue}/events")
+async def queue_events(profile: str, sub: str, queue: str):
+    # SSE: a "snapshot" event, then "delta" events ({added, removed}) as the shared poller sees changes;
+    # "error" events report failed polls ({error, retry_in}), ": ping" comments keep idle streams open
+    if queue not in QUEUES or queue == "inbox":
+        raise HTTPException(status_code=404, detail="Unknown queue")
+    return sse(poller.subscribe(WatchKey(profile.lower(), sub.lower(), queue)))
+
+
+# Generic listing; declared after the queue routes so /r/{sub}/modqueue etc. are not
+# captured as a sort
+@read.get("/{profile}/r/{sub}/{sort}")
+async def get_listing(profile: str, sub: str, sort: str, after: Optional[str] = None, before: Optional[str] = None, limit: int = 25, t: Optional[str] = None, stream: bool = False):
+    if stream:
+        limit = min(limit, STREAM_MAX)
+        return ndjson(paged(await reddit_listing_stream(profile, sub, sort, after, limit, t), limit))
+    return await reddit_listing(profile, sub=sub, sort=sort, after=after, before=before, limit=limit, time_filter=t)
 
 
 # Moderation actions
 @write.post("/{profile}/mod/approve")
-def approve(profile: str, thing_id: str):
-    return mod_approve(profile, thing_id)
+async def approve(profile: str, thing_id: str):
+    return await mod_approve(profile, thing_id)
 
 
 @write.post("/{profile}/mod/remove")
-def remove(profile: str, thing_id: str, spam: bool = False):
-    return mod_remove(profile, thing_id, spam)
+async def remove(profile: str, thing_id: str, spam: bool = False):
+    return await mod_remove(profile, thing_id, spam)
 
 
 @write.post("/{profile}/mod/lock")
-def lock(profile: str, thing_id: str):
-    return mod_lock(profile, thing_id)
+async def lock(profile: str, thing_id: str):
+    return await mod_lock(profile, thing_id)
 
 
 @write.post("/{profile}/mod/unlock")
-def unlock(profile: str, thing_id: str):
-    return mod_unlock(profile, thing_id)
+async def unlock(profile: str, thing_id: str):
+    return await mod_unlock(profile, thing_id)
 
 
 @write.post("/{profile}/mod/sticky")
-def sticky(profile: str, thing_id: str, state: bool):
-    return mod_sticky(profile, thing_id, state)
+async def sticky(profile: str, thing_id: str, state: bool):
+    return await mod_sticky(profile, thing_id, state)
 
 
 @write.post("/{profile}/mod/distinguish")
-def distinguish(profile: str, thing_id: str, how: str):
-    return mod_distinguish(profile, thing_id, how)
+async def distinguish(profile: str, thing_id: str, how: str):
+    return await mod_distinguish(profile, thing_id, how)
+
+
+@write.post("/{profile}/mod/batch")
+async def batch(profile: str, actions: List[ModBatchAction] = Body(..., max_length=1000)):
+    # Results stream back as NDJSON in completion order; "index" maps to the request
+    return ndjson(mod_batch(profile, [a.model_dump() for a in actions]))
 
 
 @write.post("/{profile}/mod/ban")
-def ban(profile: str, user: str, sub: str, reason: str | None = None, days: int | None = None):
-    return mod_ban(profile, user, sub, reason, days)
+async def ban(profile: str, user: str, sub: str, reason: str | None = None, days: int | None = None):
+    return await mod_ban(profile, user, sub, reason, days)
 
 
 @write.post("/{profile}/mod/unban")
-def unban(profile: str, user: str, sub: str):
-    return mod_unban(profile, user, sub)
+async def unban(profile: str, user: str, sub: str):
+    return await mod_unban(profile, user, sub)
 
 
 @write.post("/{profile}/r/{sub}/flair/user")
-def flair_u(profile: str, sub: str, user: str, flair_text: str | None = None, flair_template_id: str | None = None):
-    return flair_user(profile, sub, user, flair_text, flair_template_id)
+async def flair_u(profile: str, sub: str, user: str, flair_text: str | None = None, flair_template_id: str | None = None):
+    return await flair_user(profile, sub, user, flair_text, flair_template_id)
 
 
 @write.post("/{profile}/r/{sub}/flair/link")
-def flair_l(profile: str, sub: str, thing_id: str, flair_text: str | None = None, flair_template_id: str | None = None):
-    return flair_link(profile, sub, thing_id, flair_text, flair_template_id)
+async def flair_l(profile: str, sub: str, thing_id: str, flair_text: str | None = None, flair_template_id: str | None = None):
+    return await flair_link(profile, sub, thing_id, flair_text, flair_template_id)
 
 
 @write.post("/{profile}/r/{sub}/set_suggested_sort")
-def set_sort(profile: str, sub: str, thing_id: str, sort: str):
-    return set_suggested_sort(profile, sub, thing_id, sort)
+async def set_sort(profile: str, sub: str, thing_id: str, sort: str):
+    return await set_suggested_sort(profile, sub, thing_id, sort)
 
 
 # Messaging
 @read.get("/{profile}/inbox")
-def inbox(profile: str, type: str = "all", after: Optional[str] = None, limit: int = 25):
-    return inbox_list(profile, type, after, limit)
-
-
-@write.post("/{profile}/message")
-def message(profile: str, to: str, subject: str, text: str):
-    return send_message(profile, to, subject, text)
-
-
-# Proxy allowlist
-@read.get("/ops")
-def list_ops():
-    return ops_registry()
-
-
-@read.get("/ops/{namespace}/{operation}")
-def get_op(namespace: str, operation: str):
-    reg = ops_registry()
-    return reg.get("schemas", {}).get(f"{namespace}.{operation}") or {"detail": "Not found"}
-
+async def inbox(profile: str, type: str = "all", after: Optional[str] = None, limit: int = 25, stream: bool = False):
+    if stream:
+        limit = min(limit, STREAM_MAX)
+        return ndjson(paged(await inbox_stream(profile, type, after, limit), limit))
+    return await inbox_list(profile, type, after, limit)
+
+
+@read.get("/{profile}/inbox/events")
+async def inbox_events(profile: str):
+    return sse(poller.subscribe(WatchKey(profile.lower(), "", "inbox")))
+
+
+@write.post("/{profile}/message", status_code=202)
+async def message(request: Request, profile: str, to: str, subject: str, text: str, run_at: Optional[float] = None, idempotency_key: Optional[str] = Header(None, max_length=200)):
+    return await _enqueue(request, "message", {"profile": profile, "to": to, "subject": subject, "text": text}, run_at, idempotency_key)
+
+
+@read.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await db.run(db.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@write.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    # Only jobs still waiting in the queue can be cancelled
+    if not await db.run(db.cancel_job, job_id):
+        raise HTTPException(status_code=409, detail="Job not found or already started")
+    return {"ok": True}
+
+
+# Mounted on the read router: each op declares its own scope, and write ops are
+# refused unless the caller also holds reddit:write
+@read.post("/{profile}/proxy")
+async def proxy(request: Request, profile: str, namespace: str, operation: str, params: Optional[dict] = Body(None)):
+    try:
+        return await proxy_dispatch(profile, namespace, operation, params, has_scope(request, "reddit:write"))
+    except UnknownOperation as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except OperationForbidden as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@read.post("/{profile}/proxy/batch")
+async def proxy_many(
+    request: Request,
+    profile: str,
+    calls: List[ProxyCall] = Body(..., max_length=100),
+    stream: bool = False,
+    timeout: Optional[float] = Query(None, gt=0, le=120),
+):
+    # Per-call failures are reported inline ({ok: false, status, error}); the batch itself is 200
+    entries = [c.model_dump() for c in calls]
+    writable = has_scope(request, "reddit:write")
+    if stream:
+        return ndjson(proxy_batch_stream(profile, entries, timeout, writable))
+    return {"results": await proxy_batch(profile, entries, timeout, writable)}
 
-@write.post("/{profile}/proxy")
-def proxy(profile: str, namespace: str, operation: str, params: dict):
-    return proxy_dispatch(profile, namespace, operation, params)
 
 # Mount grouped routers under /reddit
 router.include_router(read)
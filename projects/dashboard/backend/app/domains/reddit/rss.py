@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+# pip install httpx[http2] feedparser
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import feedparser
+import httpx
+
+from ...settings import get_settings
+
+try:  # HTTP/2 needs the optional h2 package (httpx[http2])
+    import h2  # noqa: F401
+
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+USER_AGENT = "moonshit.dev/rss"
+RSS_SORTS = {"hot", "new", "top", "rising", "controversial"}
+FEED_FRESH = 60.0  # seconds a parsed feed is served without revalidating
+FEED_MAX = 512  # parsed feeds kept in memory
+
+
+@dataclass
+class _Feed:
+    items: list[dict]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    checked: float = field(default_factory=time.time)
+
+
+class _Breaker:
+    """Per-key circuit: open after ``threshold`` consecutive failures for ``cooldown`` seconds.
+
+    While open, callers skip PRAW and read RSS. Once the cool-down lapses one
+    caller is let through as a trial; success closes the circuit, failure
+    re-opens it for another window.
+    """
+
+    __slots__ = ("failures", "open_until", "trial")
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False
+
+
+class RSSFeeds:
+    """Pooled, conditional RSS fetches with a parsed-feed store and circuit breakers."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._client: Optional[httpx.AsyncClient] = None
+        self._feeds: OrderedDict[str, _Feed] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._breakers: dict[str, _Breaker] = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.fetches = 0
+        self.errors = 0
+        self.trips = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2,
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Circuit breaker
+
+    def use_api(self, key: str) -> bool:
+        # False while the circuit is open: go straight to RSS
+        b = self._breakers.get(key)
+        if b is None or not b.open_until:
+            return True
+        if time.time() < b.open_until or b.trial:
+            return False
+        b.trial = True  # half-open: this caller probes the API
+        return True
+
+    def success(self, key: str) -> None:
+        self._breakers.pop(key, None)
+
+    def abandon(self, key: str) -> None:
+        # Probe ended without a verdict (cancelled or refused locally); let the next caller try instead
+        b = self._breakers.get(key)
+        if b is not None:
+            b.trial = False
+
+    def failure(self, key: str) -> None:
+        b = self._breakers.setdefault(key, _Breaker())
+        b.failures += 1
+        if b.trial or b.failures >= self.threshold:
+            if not b.trial:
+                self.trips += 1
+            b.open_until = time.time() + self.cooldown
+            b.trial = False
+
+    # Feeds
+
+    async def listing(self, sub: str, sort: str) -> list[dict]:
+        path = f"r/{sub}/{sort}" if sort in RSS_SORTS else f"r/{sub}"
+        key = path.lower()
+        feed = self._feeds.get(key)
+        if feed is not None and time.time() - feed.checked < FEED_FRESH:
+            self.hits += 1
+            self._feeds.move_to_end(key)
+            return feed.items
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(key, f"https://www.reddit.com/{path}/.rss"))
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, url: str) -> list[dict]:
+        feed = self._feeds.get(key)
+        headers = {}
+        if feed is not None:
+            if feed.etag:
+                headers["If-None-Match"] = feed.etag
+            if feed.last_modified:
+                headers["If-Modified-Since"] = feed.last_modified
+        try:
+            r = await self._http().get(url, headers=headers)
+            if r.status_code == 304 and feed is not None:
+                self.not_modified += 1
+                feed.checked = time.time()
+                return feed.items
+            r.raise_for_status()
+        except httpx.HTTPError:
+            self.errors += 1
+            if feed is not None:
+                return feed.items  # stale beats nothing while Reddit is degraded
+            raise
+        self.fetches += 1
+        # feedparser is pure Python and slow on big feeds; keep it off the loop
+        parsed = await asyncio.to_thread(feedparser.parse, r.content)
+        items = [{"title": e.get("title"), "link": e.get("link"), "published": e.get("published")} for e in parsed.entries]
+        self._feeds[key] = _Feed(items, r.headers.get("etag"), r.headers.get("last-modified"))
+        self._feeds.move_to_end(key)
+        while len(self._feeds) > FEED_MAX:
+            self._feeds.popitem(last=False)
+        return items
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "http2": HTTP2,
+            "feeds": len(self._feeds),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "fetches": self.fetches,
+            "errors": self.errors,
+            "trips": self.trips,
+            "open": sorted(k for k, b in self._breakers.items() if b.open_until > now),
+        }
+
+
+def _build() -> RSSFeeds:
+    s = get_settings()
+    return RSSFeeds(s.reddit_breaker_threshold, s.reddit_breaker_cooldown)
+
+
+rss = _build()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from ...settings import get_settings
+
+
+INTERACTIVE = 0
+BULK = 1
+
+# Priority of upstream calls made from the current task; batch jobs and streams
+# set BULK so interactive reads overtake them in the per-profile queue.
+priority: contextvars.ContextVar[int] = contextvars.ContextVar("reddit_priority", default=INTERACTIVE)
+
+
+class RateLimited(Exception):
+    def __init__(self, profile: str, retry_after: float):
+        super().__init__(f"Reddit budget for profile {profile} exhausted; retry in {retry_after:.0f}s")
+        self.profile = profile
+        self.retry_after = retry_after
+
+
+class ProfileScheduler:
+    """Admission control for one profile's upstream calls.
+
+    Tracks Reddit's remaining request budget and reset time (from the
+    ``X-Ratelimit-*`` headers PRAW exposes via ``reddit.auth.limits``), runs at
+    most ``slots`` calls at once, and queues the rest by priority. A call whose
+    estimated wait exceeds the SLO is rejected up front with ``RateLimited``
+    rather than parking a thread inside PRAW's own rate-limit sleep.
+    """
+
+    def __init__(self, name: str, slots: int, slo: dict[int, float]):
+        self.name = name
+        self.slots = slots
+        self.slo = slo
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.remaining: Optional[float] = None
+        self.reset_at: Optional[float] = None
+        self.avg_service = 0.5  # seconds, EWMA of observed call latency
+        self.admitted = 0
+        self.rejected = 0
+        self.budget_waits = 0
+
+    def _queued(self) -> int:
+        return sum(1 for *_, f in self._waiters if not f.done())
+
+    def _queued_ahead(self, prio: int) -> int:
+        return sum(1 for p, _, f in self._waiters if p <= prio and not f.done())
+
+    def estimate_wait(self, prio: int) -> float:
+        now = time.time()
+        ahead = self._queued_ahead(prio)
+        wait = 0.0
+        if self.active >= self.slots or ahead:
+            wait = (ahead + 1) / self.slots * self.avg_service
+        if self.remaining is not None and self.reset_at and self.reset_at > now:
+            # Calls that will spend budget before ours, including ours
+            if self.active + ahead + 1 > self.remaining:
+                wait = max(wait, self.reset_at - now)
+        return wait
+
+    @asynccontextmanager
+    async def slot(self, prio: int) -> AsyncIterator[None]:
+        wait = self.estimate_wait(prio)
+        if wait > self.slo.get(prio, self.slo[INTERACTIVE]):
+            self.rejected += 1
+            raise RateLimited(self.name, wait)
+        await self._acquire(prio)
+        try:
+            await self._spend_budget()
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, prio: int) -> None:
+        if self.active < self.slots and not self._queued():
+            self.active += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (prio, next(self._seq), fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    # Slot was handed over just as we were cancelled; pass it on
+                    self._release()
+                raise
+        self.admitted += 1
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)  # hand the slot over directly
+                return
+        self.active -= 1
+
+    async def _spend_budget(self) -> None:
+        now = time.time()
+        if self.remaining is not None and self.remaining < 1 and self.reset_at and self.reset_at > now:
+            self.budget_waits += 1
+            await asyncio.sleep(self.reset_at - now)
+            self.remaining = None  # unknown until the next response
+        if self.remaining is not None:
+            self.remaining -= 1  # optimistic; corrected by observe()
+
+    def observe(self, limits: Optional[dict], elapsed: float) -> None:
+        self.avg_service = 0.8 * self.avg_service + 0.2 * elapsed
+        if not limits:
+            return
+        if limits.get("remaining") is not None:
+            self.remaining = float(limits["remaining"])
+        if limits.get("reset_timestamp"):
+            self.reset_at = float(limits["reset_timestamp"])
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "slots": self.slots,
+            "active": self.active,
+            "queued": self._queued(),
+            "remaining": self.remaining,
+            "reset_in": round(self.reset_at - now, 1) if self.reset_at and self.reset_at > now else None,
+            "avg_service": round(self.avg_service, 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "budget_waits": self.budget_waits,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self._profiles: dict[str, ProfileScheduler] = {}
+
+    def for_profile(self, profile: str) -> ProfileScheduler:
+        key = profile.lower()
+        ps = self._profiles.get(key)
+        if ps is None:
+            s = get_settings()
+            slo = {INTERACTIVE: s.reddit_slo_seconds, BULK: s.reddit_bulk_slo_seconds}
+            ps = self._profiles[key] = ProfileScheduler(key, s.reddit_profile_concurrency, slo)
+        return ps
+
+    def stats(self) -> dict:
+        return {name: ps.stats() for name, ps in self._profiles.items()}
+
+
+scheduler = Scheduler()
@@ -1,162 +1,506 @@
 from __future__ import annotations
 
-# pip install praw httpx feedparser
+# pip install praw
+import asyncio
 import concurrent.futures
-from typing import Any, Optional
+import itertools
+import time
+from typing import Any, AsyncIterator, Callable, Hashable, Iterable, Iterator, Optional, TypeVar
 
-import httpx
-import feedparser
 import praw
+from praw.endpoints import API_PATH
+from praw.models import MoreComments
 
 from ...settings import get_settings
+from .cache import response_cache, sub_tag, thing_tag
+from .clients import registry
+from .rss import rss
+from .store import store
+from .scheduler import BULK, RateLimited, priority, scheduler
 
 
-_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+T = TypeVar("T")
 
+# PRAW is blocking, so upstream calls run on this pool while the event loop only
+# awaits them; request handlers no longer hold a threadpool slot of their own.
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=get_settings().reddit_max_workers, thread_name_prefix="reddit"
+)
 
-def _profile_env(prefix: str) -> dict[str, str]:
-    import os
 
-    up = prefix.upper()
+def _limits(profile: str) -> Optional[dict]:
+    reddit = registry.peek(profile)
+    return getattr(getattr(reddit, "auth", None), "limits", None)
+
+
+async def _run(profile: str, work: Callable[[], T]) -> T:
+    # The profile's scheduler bounds in-flight calls, orders queued ones by
+    # priority and refuses (RateLimited) when the wait would exceed the SLO.
+    # Cancelling the awaiting task (client went away) drops a queued call; a
+    # call already on a thread runs to completion.
+    ps = scheduler.for_profile(profile)
+    async with ps.slot(priority.get()):
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_executor, work)
+        finally:
+            ps.observe(_limits(profile), time.monotonic() - started)
+
+
+async def _run_bulk(profile: str, work: Callable[[], T]) -> T:
+    # Runs in its own task, so the priority change does not leak to the caller
+    priority.set(BULK)
+    return await _run(profile, work)
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one upstream request.
+
+    Every caller awaits the same task and receives its result or exception. The
+    shared task is cancelled only once all of its callers have gone away.
+    """
+
+    class _Call:
+        __slots__ = ("task", "waiters")
+
+        def __init__(self, task: asyncio.Task):
+            self.task = task
+            self.waiters = 0
+
+    def __init__(self):
+        self._calls: dict[Hashable, SingleFlight._Call] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = self._Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _t: self._forget(key, call))
+            self.leaders += 1
+        else:
+            self.shared += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: "SingleFlight._Call") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "shared": self.shared, "inflight": len(self._calls)}
+
+
+singleflight = SingleFlight()
+
+
+async def _shared(profile: str, op: str, args: tuple, work: Callable[[], T]) -> T:
+    # Reads only: identical concurrent writes must still each reach Reddit
+    return await singleflight.do((profile.lower(), op, args), lambda: _run(profile, work))
+
+
+STREAM_PAGE = 100  # items pulled per scheduler slot; Reddit's largest listing page
+
+
+async def _stream(profile: str, produce: Callable[[], Iterable[Any]], serialize: Callable[[Any], Optional[dict]]) -> AsyncIterator[dict]:
+    """Stream serialized items while PRAW's generator is still paging.
+
+    The generator is advanced on the executor in chunks of up to STREAM_PAGE
+    items, each under its own scheduler slot, with one chunk fetched ahead of
+    the consumer. A slow client therefore holds neither a slot nor a thread
+    between pages, and memory stays flat however deep the listing goes. The
+    first chunk is fetched before this returns, so a refusal raises
+    RateLimited while the route can still answer 429.
+    """
+    source: Optional[Iterator[Any]] = None
+
+    def pull() -> tuple[list[dict], bool]:
+        # Next chunk, and whether the generator may have more
+        nonlocal source
+        if source is None:
+            source = iter(produce())
+        items, pulled = [], 0
+        for obj in itertools.islice(source, STREAM_PAGE):
+            pulled += 1
+            item = serialize(obj)
+            if item is not None:
+                items.append(item)
+        return items, pulled == STREAM_PAGE
+
+    def fetch() -> asyncio.Task:
+        # Own task per chunk, so _run_bulk's priority stays out of the caller's context
+        return asyncio.ensure_future(_run_bulk(profile, pull))
+
+    return _chunks(await fetch(), fetch)
+
+
+async def _chunks(chunk: tuple[list[dict], bool], fetch: Callable[[], asyncio.Task]) -> AsyncIterator[dict]:
+    items, more = chunk
+    ahead: Optional[asyncio.Task] = fetch() if more else None
+    try:
+        while True:
+            for item in items:
+                yield item
+            if ahead is None:
+                return
+            items, more = await ahead
+            ahead = fetch() if more else None
+    finally:
+        if ahead is not None and not ahead.cancel() and not ahead.cancelled():
+            ahead.exception()  # consumer is gone; nobody wants the prefetch's error
+
+
+def _cursors(names: list[Optional[str]], limit: Optional[int]) -> dict:
+    # "after" is only returned when the page was full, i.e. more may follow
+    names = [n for n in names if n]
     return {
-        "client_id": os.environ.get(f"REDDIT_{up}_CLIENT_ID", ""),
-        "client_secret": os.environ.get(f"REDDIT_{up}_CLIENT_SECRET", ""),
-        "refresh_token": os.environ.get(f"REDDIT_{up}_REFRESH_TOKEN", ""),
-        "user_agent": os.environ.get(f"REDDIT_{up}_USER_AGENT", f"moonshit.dev/{up}") or f"moonshit.dev/{up}",
-        "username": os.environ.get(f"REDDIT_{up}_USERNAME", ""),
-        "password": os.environ.get(f"REDDIT_{up}_PASSWORD", ""),
+        "after": names[-1] if names and limit and len(names) >= limit else None,
+        "before": names[0] if names else None,
     }
 
 
+def _page_params(after: Optional[str], before: Optional[str] = None) -> dict:
+    params = {}
+    if after:
+        params["after"] = after
+    if before:
+        params["before"] = before
+    return params
+
+
+# (ttl, stale-while-revalidate) seconds per cached read
+CACHE_TTLS: dict[str, tuple[float, float]] = {
+    "about": (300.0, 900.0),
+    "rules": (900.0, 3600.0),
+    "wiki": (300.0, 900.0),
+    "listing": (15.0, 60.0),
+    "search": (60.0, 120.0),
+    "thing": (30.0, 0.0),
+}
+
+
+async def _cached(kind: str, key: str, fetch: Callable[[], Any], tags=()) -> Any:
+    ttl, swr = CACHE_TTLS[kind]
+    return await response_cache.get_or_fetch(f"{kind}:{key}", fetch, ttl=ttl, swr=swr, tags=tags)
+
+
+async def _write(profile: str, work: Callable[[], T], *tags: Optional[str]) -> T:
+    # Run a write and evict cached reads that mention what it touched
+    result = await _run(profile, work)
+    await response_cache.invalidate(*tags)
+    return result
+
+
+def _item_tags(sub: Optional[str]):
+    # Listings are tagged with their subreddit and every thing they contain so a
+    # write to any one of those things evicts the listing too.
+    def tags(value: dict):
+        out = [t for t in (sub_tag(sub),) if t]
+        out.extend(thing_tag(i.get("name")) for i in value.get("items", []) if i.get("name"))
+        return out
+
+    return tags
+
+
+def _submission_dict(p) -> dict:
+    return {
+        "id": p.id,
+        "name": p.name,
+        "title": p.title,
+        "author": str(getattr(p, 'author', None)) if getattr(p, 'author', None) else None,
+        "created_utc": p.created_utc,
+        "score": p.score,
+        "num_comments": p.num_comments,
+        "url": p.url,
+        "permalink": p.permalink,
+        "over_18": p.over_18,
+        "edited": getattr(p, "edited", False) or None,
+        "subreddit": str(getattr(p, "subreddit", "") or "") or None,
+    }
+
+
+def _thing_dict(obj) -> Optional[dict]:
+    # Full representation of a submission or comment, as served by /things
+    name = getattr(obj, "name", None) or ""
+    if name.startswith("t3_"):
+        out = _submission_dict(obj)
+    elif name.startswith("t1_"):
+        out = {
+            "id": obj.id,
+            "name": name,
+            "author": str(obj.author) if getattr(obj, "author", None) else None,
+            "body": obj.body,
+            "score": getattr(obj, "score", 0),
+            "created_utc": obj.created_utc,
+            "link_id": obj.link_id,
+            "parent_id": obj.parent_id,
+            "permalink": obj.permalink,
+            "edited": getattr(obj, "edited", False) or None,
+        }
+    else:
+        return None
+    out["kind"] = name[:2]
+    out["subreddit"] = str(getattr(obj, "subreddit", "") or "") or None
+    return out
+
+
+def _message_dict(m) -> dict:
+    return {
+        "id": m.id,
+        "name": m.name,
+        "subject": getattr(m, "subject", None),
+        "author": str(m.author) if getattr(m, "author", None) else None,
+        "body": getattr(m, "body", None),
+        "created_utc": getattr(m, "created_utc", None),
+        "new": getattr(m, "new", None),
+    }
+
+
+def _modaction_dict(a) -> dict:
+    return {
+        "id": a.id,
+        "action": a.action,
+        "mod": str(a.mod) if getattr(a, "mod", None) else None,
+        "target_fullname": getattr(a, "target_fullname", None),
+        "target_author": getattr(a, "target_author", None),
+        "details": getattr(a, "details", None),
+        "description": getattr(a, "description", None),
+        "subreddit": str(getattr(a, "subreddit", "") or "") or None,
+        "created_utc": a.created_utc,
+    }
+
+
+def _cache_things(profile: str, things: list[dict]) -> None:
+    # Prime /things and keep a copy in the local history store
+    store.upsert_things(things)
+    ttl, swr = CACHE_TTLS["thing"]
+    for t in things:
+        response_cache.put(f"thing:{profile}:{t['name']}", t, ttl=ttl, swr=swr, tags=[thing_tag(t["name"]), sub_tag(t.get("subreddit"))])
+
+
 def _reddit(profile: str) -> praw.Reddit:
-    cfg = _profile_env(profile)
-    if not cfg["client_id"] or not cfg["client_secret"]:
-        raise RuntimeError("Reddit client id/secret missing for profile")
-    if cfg["refresh_token"]:
-        return praw.Reddit(
-            client_id=cfg["client_id"],
-            client_secret=cfg["client_secret"],
-            refresh_token=cfg["refresh_token"],
-            user_agent=cfg["user_agent"],
-        )
-    if cfg["username"] and cfg["password"]:
-        return praw.Reddit(
-            client_id=cfg["client_id"],
-            client_secret=cfg["client_secret"],
-            username=cfg["username"],
-            password=cfg["password"],
-            user_agent=cfg["user_agent"],
-        )
-    raise RuntimeError("Reddit creds must provide either refresh token or username/password")
-
-
-def reddit_me(profile: str) -> dict:
+    return registry.get(profile)
+
+
+def _thing(reddit: praw.Reddit, thing_id: str):
+    tid = thing_id.split("_", 1)[1]
+    return reddit.submission(id=tid) if thing_id.startswith("t3_") else reddit.comment(id=tid)
+
+
+async def reddit_me(profile: str) -> dict:
     def _work():
         me = _reddit(profile).user.me()
         return {"name": me.name, "id": me.id}
 
-    return _executor.submit(_work).result()
+    return await _shared(profile, "me", (), _work)
 
 
-def subreddit_about(profile: str, sub: str) -> dict:
+async def subreddit_about(profile: str, sub: str) -> dict:
     def _work():
         s = _reddit(profile).subreddit(sub)
         return {"display_name": s.display_name, "title": s.title, "subscribers": s.subscribers, "over18": s.over18}
 
-    return _executor.submit(_work).result()
+    return await _cached("about", f"{profile}:{sub.lower()}", lambda: _run(profile, _work), tags=[sub_tag(sub)])
 
 
-def subreddit_rules(profile: str, sub: str) -> dict:
+async def subreddit_rules(profile: str, sub: str) -> dict:
     def _work():
         rules = _reddit(profile).subreddit(sub).rules()
         return {"rules": [r.short_name for r in rules]}
 
-    return _executor.submit(_work).result()
+    return await _cached("rules", f"{profile}:{sub.lower()}", lambda: _run(profile, _work), tags=[sub_tag(sub)])
 
 
-def subreddit_wiki(profile: str, sub: str, path: str) -> dict:
+async def subreddit_wiki(profile: str, sub: str, path: str) -> dict:
     def _work():
         page = _reddit(profile).subreddit(sub).wiki[path]
         return {"content_md": page.content_md}
 
-    return _executor.submit(_work).result()
+    return await _cached("wiki", f"{profile}:{sub.lower()}:{path}", lambda: _run(profile, _work), tags=[sub_tag(sub)])
 
 
-def reddit_listing(profile: str, sub: Optional[str], sort: str, after: Optional[str], limit: int, time_filter: Optional[str] = None, modonly: bool = False) -> dict:
+def _listing_gen(reddit: praw.Reddit, sub: str, sort: str, limit: Optional[int], time_filter: Optional[str], params: dict):
+    s = reddit.subreddit(sub)
+    if sort == "new":
+        return s.new(limit=limit, params=params)
+    if sort == "hot":
+        return s.hot(limit=limit, params=params)
+    if sort == "top":
+        return s.top(limit=limit, time_filter=time_filter or "day", params=params)
+    if sort == "rising":
+        return s.rising(limit=limit, params=params)
+    if sort == "controversial":
+        return s.controversial(limit=limit, time_filter=time_filter or "day", params=params)
+    raise ValueError("bad sort")
+
+
+async def reddit_listing(profile: str, sub: Optional[str], sort: str, after: Optional[str], limit: int, time_filter: Optional[str] = None, modonly: bool = False, before: Optional[str] = None) -> dict:
     def _work():
         if sort == "subs":
             me = _reddit(profile).user.me()
             subs = list(me.moderator_subreddits(limit=None) if modonly else me.subreddits(limit=None))
             return {"subs": [s.display_name for s in subs]}
-        s = _reddit(profile).subreddit(sub)
-        listing = []
-        gen = None
-        if sort == "new":
-            gen = s.new(limit=limit)
-        elif sort == "hot":
-            gen = s.hot(limit=limit)
-        elif sort == "top":
-            gen = s.top(limit=limit, time_filter=time_filter or "day")
-        elif sort == "rising":
-            gen = s.rising()
-        elif sort == "controversial":
-            gen = s.controversial(limit=limit, time_filter=time_filter or "day")
-        else:
-            raise ValueError("bad sort")
-        for p in gen:
-            listing.append({
-                "id": p.id,
-                "name": p.name,
-                "title": p.title,
-                "author": str(getattr(p, 'author', None)) if getattr(p, 'author', None) else None,
-                "created_utc": p.created_utc,
-                "score": p.score,
-                "num_comments": p.num_comments,
-                "url": p.url,
-                "permalink": p.permalink,
-                "over_18": p.over_18,
-            })
-        return {"items": listing}
+        gen = _listing_gen(_reddit(profile), sub, sort, limit, time_filter, _page_params(after, before))
+        listing = [_submission_dict(p) for p in gen]
+        store.upsert_things(listing)
+        return {"items": listing, **_cursors([i["name"] for i in listing], limit)}
+
+    async def _fetch():
+        if not sub or sort == "subs":
+            return await _run(profile, _work)
+        # Read-only RSS fallback; the breaker keeps a failing sub on RSS for a
+        # cool-down instead of paying for a doomed PRAW call on every request.
+        circuit = f"{profile.lower()}:{sub.lower()}"
+        if rss.use_api(circuit):
+            try:
+                result = await _run(profile, _work)
+            except (asyncio.CancelledError, RateLimited):
+                # Not an upstream failure: the client left, or our own scheduler
+                # refused (answered as 429), so the breaker learns nothing
+                rss.abandon(circuit)
+                raise
+            except Exception:
+                rss.failure(circuit)
+            else:
+                rss.success(circuit)
+                return result
+        return {"items": await rss.listing(sub, sort), "readonly": True}
+
+    key = f"{profile}:{(sub or '').lower()}:{sort}:{after}:{before}:{limit}:{time_filter}:{modonly}"
+    return await _cached("listing", key, _fetch, tags=_item_tags(sub))
+
+
+async def reddit_listing_stream(profile: str, sub: str, sort: str, after: Optional[str], limit: Optional[int], time_filter: Optional[str] = None) -> AsyncIterator[dict]:
+    return await _stream(profile, lambda: _listing_gen(_reddit(profile), sub, sort, limit, time_filter, _page_params(after)), _submission_dict)
+
+
+async def reddit_search(profile: str, q: str, sub: Optional[str], type: Optional[str]):
+    def _work():
+        sr = _reddit(profile).subreddit(sub or "all")
+        results = sr.search(q, syntax="lucene", limit=25)
+        return {"items": [{"id": p.id, "title": p.title, "author": str(p.author) if p.author else None, "permalink": p.permalink} for p in results]}
 
-    try:
-        return _executor.submit(_work).result()
-    except Exception:
-        # RSS fallback (read-only)
-        if sub:
-            url = f"https://www.reddit.com/r/{sub}/.rss"
-            r = httpx.get(url, headers={"User-Agent": "moonshit.dev/rss"}, timeout=10)
-            feed = feedparser.parse(r.text)
-            items = [{"title": e.get("title"), "link": e.get("link"), "published": e.get("published")} for e in feed.entries]
-            return {"items": items, "readonly": True}
-        raise
+    key = f"{profile}:{(sub or 'all').lower()}:{type}:{q}"
+    return await _cached("search", key, lambda: _run(profile, _work), tags=[sub_tag(sub or "all")])
 
 
-def reddit_search(profile: str, q: str, sub: Optional[str], type: Optional[str]):
+def _comment_node(c, depth: int) -> dict:
+    return {
+        "kind": "comment",
+        "id": c.id,
+        "name": c.name,
+        "parent_id": c.parent_id,
+        "depth": depth,
+        "author": str(c.author) if c.author else None,
+        "body": c.body,
+        "score": getattr(c, 'score', 0),
+    }
+
+
+def _more_node(parent_id: str, depth: int, children: list[str], count: int) -> dict:
+    # Continuation token: expand via /comments/{post_id}/more?children=... or, when
+    # children is empty ("continue this thread"), ?parent=<parent_id>
+    return {"kind": "more", "parent_id": parent_id, "depth": depth, "children": children, "count": count}
+
+
+def _walk_comments(roots, max_depth: int, max_comments: int, base_depth: int = 0, children_of: Optional[Callable[[Any], list]] = None):
+    """Depth-first, iterative walk of a comment forest yielding flat nodes.
+
+    Subtrees below ``max_depth`` and anything past ``max_comments`` are returned
+    as "more" tokens instead of being loaded, so memory and recursion stay bounded.
+    """
+    children_of = children_of or (lambda n: list(getattr(n, "replies", None) or []))
+    stack = [(n, base_depth) for n in reversed(list(roots))]
+    emitted = 0
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, MoreComments):
+            yield _more_node(node.parent_id, depth, list(node.children), node.count)
+            continue
+        if emitted >= max_comments:
+            # Budget spent: hand back what is left as one token per parent
+            rest: dict[tuple[str, int], list[str]] = {}
+            for n, d in [(node, depth)] + stack[::-1]:
+                if isinstance(n, MoreComments):
+                    yield _more_node(n.parent_id, d, list(n.children), n.count)
+                else:
+                    rest.setdefault((n.parent_id, d), []).append(n.id)
+            for (pid, d), ids in rest.items():
+                yield _more_node(pid, d, ids, len(ids))
+            return
+        emitted += 1
+        yield _comment_node(node, depth)
+        replies = children_of(node)
+        if not replies:
+            continue
+        if depth >= max_depth:
+            ids: list[str] = []
+            count = 0
+            for r in replies:
+                if isinstance(r, MoreComments):
+                    ids.extend(r.children)
+                    count += r.count
+                else:
+                    ids.append(r.id)
+                    count += 1
+            yield _more_node(node.name, depth + 1, ids, count)
+            continue
+        stack.extend((r, depth + 1) for r in reversed(replies))
+
+
+def _comment_tree(profile: str, post_id: str, max_depth: int, max_comments: int):
+    s = _reddit(profile).submission(id=post_id)
+    yield {"kind": "post", "id": s.id, "title": s.title}
+    yield from _walk_comments(s.comments, max_depth, max_comments)
+
+
+async def reddit_comments(profile: str, post_id: str, max_depth: int = 10, max_comments: int = 1000):
     def _work():
-        sr = _reddit(profile).subreddit(sub) if sub else _reddit(profile).subreddit("all")
-        results = sr.search(q, syntax="lucene", limit=25)
-        return {"items": [{"id": p.id, "title": p.title, "author": str(p.author) if p.author else None, "permalink": p.permalink} for p in results]}
+        nodes = _comment_tree(profile, post_id, max_depth, max_comments)
+        post = next(nodes)
+        return {"post": {"id": post["id"], "title": post["title"]}, "comments": list(nodes)}
+
+    return await _shared(profile, "comments", (post_id, max_depth, max_comments), _work)
 
-    return _executor.submit(_work).result()
 
+async def reddit_comments_stream(profile: str, post_id: str, max_depth: int = 10, max_comments: int = 1000) -> AsyncIterator[dict]:
+    return await _stream(profile, lambda: _comment_tree(profile, post_id, max_depth, max_comments), lambda n: n)
+
+
+async def reddit_more_comments(profile: str, post_id: str, children: list[str], parent: Optional[str], depth: int = 0, max_depth: int = 10, max_comments: int = 1000):
+    """Expand one "more" token from reddit_comments into further flat nodes."""
 
-def reddit_comments(profile: str, post_id: str):
     def _work():
-        s = _reddit(profile).submission(id=post_id)
-        s.comments.replace_more(limit=0)
-        def flatten(cs):
-            out = []
-            for c in cs:
-                out.append({"id": c.id, "author": str(c.author) if c.author else None, "body": c.body, "score": getattr(c, 'score', 0)})
-                if getattr(c, 'replies', None):
-                    out.extend(flatten(c.replies))
-            return out
-        return {"post": {"id": s.id, "title": s.title}, "comments": flatten(s.comments)}
+        r = _reddit(profile)
+        if children:
+            things = []
+            for i in range(0, len(children), 100):
+                data = {"children": ",".join(children[i:i + 100]), "link_id": f"t3_{post_id}"}
+                things.extend(r.post(API_PATH["morechildren"], data=data))
+            # /api/morechildren answers with a flat list; rebuild parent links
+            names = {t.name for t in things if not isinstance(t, MoreComments)}
+            kids: dict[str, list] = {}
+            for t in things:
+                kids.setdefault(t.parent_id, []).append(t)
+            roots = [t for t in things if t.parent_id not in names]
+            nodes = _walk_comments(roots, max_depth, max_comments, depth, lambda n: kids.get(n.name, []))
+        elif parent:
+            # "Continue this thread": load the parent comment's subtree
+            _, listing = r.get(f"comments/{post_id}/_/{parent.split('_', 1)[-1]}", params={"limit": max_comments})
+            nodes = _walk_comments(listing.children[0].replies, max_depth, max_comments, depth)
+        else:
+            raise ValueError("children or parent required")
+        return {"comments": list(nodes)}
 
-    return _executor.submit(_work).result()
+    return await _shared(profile, "more", (post_id, tuple(children), parent, depth, max_depth, max_comments), _work)
 
 
-def reddit_submit(profile: str, sub: str, kind: str, title: str, text: Optional[str], url: Optional[str], nsfw: Optional[bool], spoiler: Optional[bool], flair: Optional[str]):
+async def reddit_submit(profile: str, sub: str, kind: str, title: str, text: Optional[str], url: Optional[str], nsfw: Optional[bool], spoiler: Optional[bool], flair: Optional[str]):
     def _work():
         sr = _reddit(profile).subreddit(sub)
         if kind == "self":
@@ -171,10 +515,10 @@ def reddit_submit(profile: str, sub: str, kind: str, title: str, text: Optional[
             res.mod.spoiler()
         return {"thing_id": res.name, "id": res.id, "permalink": res.permalink}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, sub_tag(sub))
 
 
-def reddit_comment(profile: str, parent_id: str, text: str):
+async def reddit_comment(profile: str, parent_id: str, text: str):
     def _work():
         if parent_id.startswith("t3_"):
             subm = _reddit(profile).submission(id=parent_id.split("_", 1)[1])
@@ -184,10 +528,10 @@ def reddit_comment(profile: str, parent_id: str, text: str):
             c = _reddit(profile).comment(id=parent_id.split("_", 1)[1]).reply(text)
             return {"id": c.id}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(parent_id))
 
 
-def reddit_edit(profile: str, thing_id: str, text: str):
+async def reddit_edit(profile: str, thing_id: str, text: str):
     def _work():
         if thing_id.startswith("t1_"):
             c = _reddit(profile).comment(id=thing_id.split("_", 1)[1])
@@ -197,10 +541,10 @@ def reddit_edit(profile: str, thing_id: str, text: str):
             s.edit(text)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def reddit_delete(profile: str, thing_id: str):
+async def reddit_delete(profile: str, thing_id: str):
     def _work():
         if thing_id.startswith("t1_"):
             _reddit(profile).comment(id=thing_id.split("_", 1)[1]).delete()
@@ -208,12 +552,12 @@ def reddit_delete(profile: str, thing_id: str):
             _reddit(profile).submission(id=thing_id.split("_", 1)[1]).delete()
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def reddit_vote(profile: str, thing_id: str, dir: int):
+async def reddit_vote(profile: str, thing_id: str, dir: int):
     def _work():
-        obj = _reddit(profile).submission(id=thing_id.split("_", 1)[1]) if thing_id.startswith("t3_") else _reddit(profile).comment(id=thing_id.split("_", 1)[1])
+        obj = _thing(_reddit(profile), thing_id)
         if dir == 1:
             obj.upvote()
         elif dir == -1:
@@ -222,84 +566,154 @@ def reddit_vote(profile: str, thing_id: str, dir: int):
             obj.clear_vote()
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def reddit_save(profile: str, thing_id: str):
+async def reddit_save(profile: str, thing_id: str):
     def _work():
-        obj = _reddit(profile).submission(id=thing_id.split("_", 1)[1]) if thing_id.startswith("t3_") else _reddit(profile).comment(id=thing_id.split("_", 1)[1])
+        obj = _thing(_reddit(profile), thing_id)
         obj.save()
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _run(profile, _work)
 
 
-def reddit_unsave(profile: str, thing_id: str):
+async def reddit_unsave(profile: str, thing_id: str):
     def _work():
-        obj = _reddit(profile).submission(id=thing_id.split("_", 1)[1]) if thing_id.startswith("t3_") else _reddit(profile).comment(id=thing_id.split("_", 1)[1])
+        obj = _thing(_reddit(profile), thing_id)
         obj.unsave()
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _run(profile, _work)
+
 
+def _queue_gen(reddit: praw.Reddit, sub: str, queue: str, limit: Optional[int], params: dict):
+    m = reddit.subreddit(sub).mod
+    if queue == "modqueue":
+        return m.modqueue(limit=limit, params=params)
+    if queue == "reports":
+        return m.reports(limit=limit, params=params)
+    if queue == "spam":
+        return m.spam(limit=limit, params=params)
+    if queue == "edited":
+        return m.edited(limit=limit, params=params)
+    if queue == "unmoderated":
+        return m.unmoderated(limit=limit, params=params)
+    if queue == "modlog":
+        return m.log(limit=limit, params=params)
+    return []
 
-def modqueue_list(profile: str, sub: str, queue: str):
+
+async def modqueue_list(profile: str, sub: str, queue: str, after: Optional[str] = None, limit: int = 50):
     def _work():
-        s = _reddit(profile).subreddit(sub)
-        if queue == "modqueue":
-            it = s.mod.modqueue(limit=50)
-        elif queue == "reports":
-            it = s.mod.reports(limit=50)
-        elif queue == "spam":
-            it = s.mod.spam(limit=50)
-        elif queue == "edited":
-            it = s.mod.edited(limit=50)
-        elif queue == "unmoderated":
-            it = s.mod.unmoderated(limit=50)
-        elif queue == "modlog":
-            it = s.mod.log(limit=50)
+        items = list(_queue_gen(_reddit(profile), sub, queue, limit, _page_params(after)))
+        things = [t for t in map(_thing_dict, items) if t]
+        # Queue listings already carry full objects; prime /things with them
+        _cache_things(profile, things)
+        _remember_queue(profile, sub, queue, items, things)
+        cursor_ids = [getattr(i, "name", None) or getattr(i, "id", None) for i in items]
+        return {"items": [getattr(i, 'id', None) for i in items], "names": [t["name"] for t in things], **_cursors(cursor_ids, limit)}
+
+    return await _shared(profile, "modqueue", (sub.lower(), queue, after, limit), _work)
+
+
+def _remember_queue(profile: str, sub: str, queue: str, items: list, things: list[dict]) -> None:
+    if queue == "modlog":
+        store.upsert_modlog([_modaction_dict(a) for a in items])
+    else:
+        store.saw(profile, sub, queue, [t["name"] for t in things])
+
+
+async def modqueue_stream(profile: str, sub: str, queue: str, after: Optional[str], limit: Optional[int]) -> AsyncIterator[dict]:
+    serialize = _modaction_dict if queue == "modlog" else _thing_dict
+    return await _stream(profile, lambda: _queue_gen(_reddit(profile), sub, queue, limit, _page_params(after)), serialize)
+
+
+async def queue_items(profile: str, sub: Optional[str], queue: str, limit: int = 100) -> list[dict]:
+    """Full serialized items currently in a mod queue (or the unread inbox when queue == "inbox")."""
+
+    def _work():
+        r = _reddit(profile)
+        if queue == "inbox":
+            return [_message_dict(m) for m in _inbox_gen(r, "unread", limit, {})]
+        items = list(_queue_gen(r, sub, queue, limit, {}))
+        if queue == "modlog":
+            actions = [_modaction_dict(a) for a in items]
+            store.upsert_modlog(actions)
+            return actions
+        things = [t for t in map(_thing_dict, items) if t]
+        _cache_things(profile, things)
+        store.saw(profile, sub, queue, [t["name"] for t in things])
+        return things
+
+    return await _run_bulk(profile, _work)
+
+
+INFO_CHUNK = 100  # Reddit's /api/info limit per request
+
+
+async def reddit_things(profile: str, ids: list[str]) -> dict:
+    """Resolve many fullnames (t1_/t3_), serving from cache and fetching the rest via /api/info."""
+    wanted = list(dict.fromkeys(i.strip() for i in ids if i.strip()))
+    bad = [i for i in wanted if not i.startswith(("t1_", "t3_"))]
+    if bad:
+        raise ValueError(f"unsupported ids: {', '.join(bad[:5])}")
+    hits = await response_cache.peek_many([f"thing:{profile}:{name}" for name in wanted])
+    found: dict[str, dict] = {}
+    missing = []
+    for name in wanted:
+        hit = hits.get(f"thing:{profile}:{name}")
+        if hit is not None:
+            found[name] = hit
         else:
-            it = []
-        return {"items": [getattr(i, 'id', None) for i in it]}
+            missing.append(name)
+
+    def _work(chunk: list[str]):
+        things = [t for t in map(_thing_dict, _reddit(profile).info(fullnames=chunk)) if t]
+        _cache_things(profile, things)
+        return things
 
-    return _executor.submit(_work).result()
+    chunks = [missing[i:i + INFO_CHUNK] for i in range(0, len(missing), INFO_CHUNK)]
+    for batch in await asyncio.gather(*(_run(profile, lambda c=c: _work(c)) for c in chunks)):
+        found.update((t["name"], t) for t in batch)
+    return {"items": [found[n] for n in wanted if n in found], "missing": [n for n in wanted if n not in found]}
 
 
-def mod_approve(profile: str, thing_id: str):
+async def mod_approve(profile: str, thing_id: str):
     def _work():
-        obj = _reddit(profile).submission(id=thing_id.split("_", 1)[1]) if thing_id.startswith("t3_") else _reddit(profile).comment(id=thing_id.split("_", 1)[1])
+        obj = _thing(_reddit(profile), thing_id)
         obj.mod.approve()
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def mod_remove(profile: str, thing_id: str, spam: bool):
+async def mod_remove(profile: str, thing_id: str, spam: bool):
     def _work():
-        obj = _reddit(profile).submission(id=thing_id.split("_", 1)[1]) if thing_id.startswith("t3_") else _reddit(profile).comment(id=thing_id.split("_", 1)[1])
+        obj = _thing(_reddit(profile), thing_id)
         obj.mod.remove(spam=spam)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def mod_lock(profile: str, thing_id: str):
+async def mod_lock(profile: str, thing_id: str):
     def _work():
         _reddit(profile).submission(id=thing_id.split("_", 1)[1]).mod.lock()
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def mod_unlock(profile: str, thing_id: str):
+async def mod_unlock(profile: str, thing_id: str):
     def _work():
         _reddit(profile).submission(id=thing_id.split("_", 1)[1]).mod.unlock()
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def mod_sticky(profile: str, thing_id: str, state: bool):
+async def mod_sticky(profile: str, thing_id: str, state: bool):
     def _work():
         s = _reddit(profile).submission(id=thing_id.split("_", 1)[1])
         if state:
@@ -308,97 +722,197 @@ def mod_sticky(profile: str, thing_id: str, state: bool):
             s.mod.sticky(state=False)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def mod_distinguish(profile: str, thing_id: str, how: str):
+async def mod_distinguish(profile: str, thing_id: str, how: str):
     def _work():
         s = _reddit(profile).submission(id=thing_id.split("_", 1)[1])
         s.mod.distinguish(how)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
 
 
-def mod_ban(profile: str, user: str, sub: str, reason: Optional[str], days: Optional[int]):
+async def mod_ban(profile: str, user: str, sub: str, reason: Optional[str], days: Optional[int]):
     def _work():
         _reddit(profile).subreddit(sub).banned.add(user, reason=reason or "", duration=days)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _run(profile, _work)
 
 
-def mod_unban(profile: str, user: str, sub: str):
+async def mod_unban(profile: str, user: str, sub: str):
     def _work():
         _reddit(profile).subreddit(sub).banned.remove(user)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _run(profile, _work)
 
 
-def flair_user(profile: str, sub: str, user: str, flair_text: Optional[str], flair_template_id: Optional[str]):
+async def flair_user(profile: str, sub: str, user: str, flair_text: Optional[str], flair_template_id: Optional[str]):
     def _work():
         _reddit(profile).subreddit(sub).flair.set(user, text=flair_text, flair_template_id=flair_template_id)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _run(profile, _work)
 
 
-def flair_link(profile: str, sub: str, thing_id: str, flair_text: Optional[str], flair_template_id: Optional[str]):
+async def flair_link(profile: str, sub: str, thing_id: str, flair_text: Optional[str], flair_template_id: Optional[str]):
     def _work():
         _reddit(profile).submission(id=thing_id.split("_", 1)[1]).flair.select(flair_template_id, text=flair_text)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, sub_tag(sub), thing_tag(thing_id))
 
 
-def set_suggested_sort(profile: str, sub: str, thing_id: str, sort: str):
+async def set_suggested_sort(profile: str, sub: str, thing_id: str, sort: str):
     def _work():
         _reddit(profile).submission(id=thing_id.split("_", 1)[1]).mod.suggested_sort(sort)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _write(profile, _work, thing_tag(thing_id))
+
+
+MOD_BATCH_ACTIONS = ("approve", "remove", "lock", "unlock", "sticky", "distinguish", "flair")
+
+
+async def _mod_action(profile: str, action: dict) -> dict:
+    kind = action["action"]
+    thing_id = action["thing_id"]
+    if kind == "approve":
+        return await mod_approve(profile, thing_id)
+    if kind == "remove":
+        return await mod_remove(profile, thing_id, bool(action.get("spam")))
+    if kind == "lock":
+        return await mod_lock(profile, thing_id)
+    if kind == "unlock":
+        return await mod_unlock(profile, thing_id)
+    if kind == "sticky":
+        return await mod_sticky(profile, thing_id, action.get("state", True))
+    if kind == "distinguish":
+        return await mod_distinguish(profile, thing_id, action.get("how") or "yes")
+    if kind == "flair":
+        return await flair_link(profile, action.get("sub"), thing_id, action.get("flair_text"), action.get("flair_template_id"))
+    raise ValueError(f"unknown action: {kind}")
+
+
+async def mod_batch(profile: str, actions: list[dict]) -> AsyncIterator[dict]:
+    """Run moderation actions concurrently, yielding one result per action as it finishes."""
+    gate = asyncio.Semaphore(get_settings().reddit_batch_concurrency)
+
+    async def one(index: int, action: dict) -> dict:
+        head = {"index": index, "action": action.get("action"), "thing_id": action.get("thing_id")}
+        priority.set(BULK)
+        async with gate:
+            try:
+                return {**head, "ok": True, "result": await _mod_action(profile, action)}
+            except RateLimited as e:
+                return {**head, "ok": False, "error": str(e), "retry_after": round(e.retry_after, 1)}
+            except Exception as e:
+                return {**head, "ok": False, "error": str(e) or e.__class__.__name__}
+
+    tasks = [asyncio.ensure_future(one(i, a)) for i, a in enumerate(actions)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        # Client went away mid-stream: drop everything not yet sent upstream
+        for t in tasks:
+            t.cancel()
+
 
+def _inbox_gen(reddit: praw.Reddit, type: str, limit: Optional[int], params: dict):
+    if type == "unread":
+        return reddit.inbox.unread(limit=limit, params=params)
+    return reddit.inbox.all(limit=limit, params=params)
 
-def inbox_list(profile: str, type: str, after: Optional[str], limit: int):
+
+async def inbox_list(profile: str, type: str, after: Optional[str], limit: int):
     def _work():
-        u = _reddit(profile).inbox
-        if type == "unread":
-            it = u.unread(limit=limit)
-        else:
-            it = u.all(limit=limit)
-        return {"items": [getattr(m, 'subject', None) for m in it]}
+        items = list(_inbox_gen(_reddit(profile), type, limit, _page_params(after)))
+        return {"items": [getattr(m, 'subject', None) for m in items], **_cursors([getattr(m, "name", None) for m in items], limit)}
+
+    return await _shared(profile, "inbox", (type, after, limit), _work)
+
 
-    return _executor.submit(_work).result()
+async def inbox_stream(profile: str, type: str, after: Optional[str], limit: Optional[int]) -> AsyncIterator[dict]:
+    return await _stream(profile, lambda: _inbox_gen(_reddit(profile), type, limit, _page_params(after)), _message_dict)
 
 
-def send_message(profile: str, to: str, subject: str, text: str):
+async def send_message(profile: str, to: str, subject: str, text: str):
     def _work():
         _reddit(profile).redditor(to).message(subject, text)
         return {"ok": True}
 
-    return _executor.submit(_work).result()
+    return await _run(profile, _work)
 
 
-def ops_registry() -> dict:
-    # Minimal skeleton of allowlisted operations and param schemas
-    schemas = {
-        "subreddit.about": {"params": {"sub": {"type": "string"}}},
-        "subreddit.rules": {"params": {"sub": {"type": "string"}}},
-        "listing.new": {"params": {"sub": {"type": "string"}, "limit": {"type": "integer"}}},
-    }
-    return {"namespaces": ["subreddit", "listing"], "schemas": schemas}
-
-
-def proxy_dispatch(profile: str, namespace: str, operation: str, params: dict) -> Any:
-    key = f"{namespace}.{operation}"
-    reg = ops_registry().get("schemas", {})
-    if key not in reg:
-        return {"detail": "Operation not allowlisted"}
-    if key == "subreddit.about":
-        return subreddit_about(profile, params.get("sub"))
-    if key == "subreddit.rules":
-        return subreddit_rules(profile, params.get("sub"))
-    if key == "listing.new":
-        return reddit_listing(profile, sub=params.get("sub"), sort="new", after=None, limit=params.get("limit", 25))
-    return {"detail": "Not implemented"}
+# Local history store (store.py): reads never touch Reddit unless refresh is asked for
+
+STORE_REFRESH_MAX = 1000  # deepest Reddit will page a listing
+
+
+async def store_refresh(profile: str, sub: str) -> dict:
+    """Pull new posts newer than the store's newest row for sub."""
+
+    def _work():
+        mark = store.newest(sub) or 0
+        fresh = []
+        # PRAW pages lazily, so stopping at the mark also stops the upstream calls.
+        # Rows at exactly the mark are re-fetched; upserts make that harmless.
+        for p in _reddit(profile).subreddit(sub).new(limit=STORE_REFRESH_MAX):
+            if p.created_utc < mark:
+                break
+            fresh.append(_submission_dict(p))
+        store.upsert_things(fresh)
+        return {"fetched": len(fresh), "since": mark or None}
+
+    return await _shared(profile, "store-refresh", (sub.lower(),), _work)
+
+
+async def modlog_sync(profile: str, sub: str) -> dict:
+    """Fetch mod log entries newer than the stored high-water mark and persist them.
+
+    Pages newest-first and stops at the last synced entry, so a sub with fewer
+    than a page of new actions since the previous sync costs one request. The
+    first sync of a sub backfills as far as Reddit will page.
+    """
+
+    def _work():
+        mark = store.modlog_mark(sub)
+        fresh = []
+        # Reddit caps each page at 100 entries whatever limit is asked for, so this
+        # pages like request_limit=100 would without needing a newer PRAW
+        for a in _reddit(profile).subreddit(sub).mod.log(limit=STORE_REFRESH_MAX):
+            if mark and (a.id == mark[0] or a.created_utc < mark[1]):
+                break
+            fresh.append(_modaction_dict(a))
+        store.sync_modlog(sub, fresh)
+        return {"fetched": len(fresh), "since": mark[1] if mark else None}
+
+    return await _shared(profile, "modlog-sync", (sub.lower(),), _work)
+
+
+async def stored_things(profile: str, sub: str, refresh: bool = False, **query) -> dict:
+    if refresh:
+        await store_refresh(profile, sub)
+    return await asyncio.to_thread(store.things, sub, **query)
+
+
+async def stored_modlog(profile: str, sub: str, refresh: bool = False, **query) -> dict:
+    if refresh:
+        await modlog_sync(profile, sub)
+    return await asyncio.to_thread(store.modlog, sub, **query)
+
+
+async def modlog_stats(profile: str, sub: str, since: float, until: float, mod: Optional[str] = None, refresh: bool = False) -> dict:
+    if refresh:
+        await modlog_sync(profile, sub)
+    return await asyncio.to_thread(store.modlog_stats, sub, since, until, mod)
+
+
+async def stored_queue(profile: str, sub: str, queue: str, since: float, until: float, refresh: bool = False) -> dict:
+    if refresh:
+        await modqueue_list(profile, sub, queue, limit=100)
+    return await asyncio.to_thread(store.queue_history, profile, sub, queue, since, until)
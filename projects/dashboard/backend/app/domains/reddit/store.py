@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+# pip install orjson
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import orjson
+
+from ...db import db_path
+from ...settings import get_settings
+
+
+class ThingStore:
+    """Local history of what the API has fetched from Reddit.
+
+    Submissions/comments are upserted by fullname (a row is only overwritten by
+    a copy that is at least as recently edited), modlog entries by id, and every
+    mod-queue fetch records when each item was seen in that queue. Writes happen
+    on the Reddit executor threads as a side effect of normal reads and never
+    fail the request that triggered them.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self.writes = 0
+        self.errors = 0
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS reddit_things (
+                name TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                subreddit TEXT,
+                author TEXT,
+                created_utc REAL NOT NULL,
+                edited REAL NOT NULL DEFAULT 0,
+                data BLOB NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reddit_things_sub ON reddit_things (subreddit, kind, created_utc DESC, name DESC);
+            CREATE TABLE IF NOT EXISTS reddit_modlog (
+                id TEXT PRIMARY KEY,
+                subreddit TEXT,
+                mod TEXT,
+                action TEXT,
+                target_fullname TEXT,
+                created_utc REAL NOT NULL,
+                data BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reddit_modlog_sub ON reddit_modlog (subreddit, created_utc DESC, id DESC);
+            CREATE TABLE IF NOT EXISTS reddit_queue_seen (
+                profile TEXT NOT NULL,
+                subreddit TEXT NOT NULL,
+                queue TEXT NOT NULL,
+                name TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (profile, subreddit, queue, name)
+            );
+            CREATE INDEX IF NOT EXISTS reddit_queue_seen_range ON reddit_queue_seen (profile, subreddit, queue, last_seen);
+            CREATE TABLE IF NOT EXISTS reddit_modlog_marks (
+                subreddit TEXT PRIMARY KEY,
+                last_id TEXT NOT NULL,
+                last_created REAL NOT NULL,
+                synced_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reddit_modlog_hourly (
+                subreddit TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                mod TEXT NOT NULL,
+                action TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (subreddit, hour, mod, action)
+            );
+            """
+        )
+        # Hourly per-moderator counts are maintained as entries arrive: the
+        # trigger only fires for rows that were actually inserted, so re-seen
+        # entries are never double counted and stats never rescan the log.
+        with conn:
+            conn.execute("BEGIN")
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name='reddit_modlog_hourly_ai'").fetchone():
+                conn.execute(
+                    """
+                    CREATE TRIGGER reddit_modlog_hourly_ai AFTER INSERT ON reddit_modlog BEGIN
+                        INSERT INTO reddit_modlog_hourly (subreddit, hour, mod, action, count)
+                        VALUES (COALESCE(NEW.subreddit, ''), CAST(NEW.created_utc / 3600 AS INTEGER) * 3600, COALESCE(NEW.mod, ''), COALESCE(NEW.action, ''), 1)
+                        ON CONFLICT (subreddit, hour, mod, action) DO UPDATE SET count = count + 1;
+                    END
+                    """
+                )
+                # Entries stored before the trigger existed
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO reddit_modlog_hourly (subreddit, hour, mod, action, count)
+                    SELECT COALESCE(subreddit, ''), CAST(created_utc / 3600 AS INTEGER) * 3600, COALESCE(mod, ''), COALESCE(action, ''), COUNT(*)
+                    FROM reddit_modlog GROUP BY 1, 2, 3, 4
+                    """
+                )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _tx(self, sql: str, rows: list[tuple]) -> None:
+        if not rows:
+            return
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(sql, rows)
+            self.writes += len(rows)
+        except sqlite3.Error:
+            # History is best-effort; the live response still goes out
+            self.errors += 1
+
+    # Writes
+
+    def upsert_things(self, things: Iterable[dict]) -> None:
+        now = time.time()
+        rows = []
+        for t in things:
+            name = t.get("name")
+            if not name or t.get("created_utc") is None:
+                continue
+            sub = t.get("subreddit")
+            rows.append((
+                name, name[:2], sub.lower() if sub else None, t.get("author"), float(t["created_utc"]),
+                float(t.get("edited") or 0), orjson.dumps(t), now, now,
+            ))
+        self._tx(
+            """
+            INSERT INTO reddit_things (name, kind, subreddit, author, created_utc, edited, data, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                data = excluded.data,
+                edited = excluded.edited,
+                subreddit = COALESCE(excluded.subreddit, reddit_things.subreddit),
+                author = COALESCE(excluded.author, reddit_things.author),
+                last_seen = excluded.last_seen
+            WHERE excluded.edited >= reddit_things.edited
+            """,
+            rows,
+        )
+
+    def upsert_modlog(self, actions: Iterable[dict]) -> None:
+        rows = [
+            (a["id"], (a.get("subreddit") or "").lower() or None, a.get("mod"), a.get("action"), a.get("target_fullname"), float(a["created_utc"]), orjson.dumps(a))
+            for a in actions
+            if a.get("id") and a.get("created_utc") is not None
+        ]
+        self._tx(
+            "INSERT OR IGNORE INTO reddit_modlog (id, subreddit, mod, action, target_fullname, created_utc, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def sync_modlog(self, sub: str, actions: list[dict]) -> None:
+        # New entries (newest first) and the advanced high-water mark, atomically
+        if not actions:
+            return
+        newest = actions[0]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO reddit_modlog (id, subreddit, mod, action, target_fullname, created_utc, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (a["id"], (a.get("subreddit") or sub).lower(), a.get("mod"), a.get("action"), a.get("target_fullname"), float(a["created_utc"]), orjson.dumps(a))
+                    for a in actions
+                ],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO reddit_modlog_marks (subreddit, last_id, last_created, synced_at) VALUES (?, ?, ?, ?)",
+                (sub.lower(), newest["id"], float(newest["created_utc"]), time.time()),
+            )
+        self.writes += len(actions)
+
+    def saw(self, profile: str, sub: str, queue: str, names: Iterable[str]) -> None:
+        now = time.time()
+        key = (profile.lower(), sub.lower(), queue)
+        self._tx(
+            """
+            INSERT INTO reddit_queue_seen (profile, subreddit, queue, name, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (profile, subreddit, queue, name) DO UPDATE SET last_seen = excluded.last_seen
+            """,
+            [(*key, n, now, now) for n in names if n],
+        )
+
+    # Reads
+
+    def newest(self, sub: str, kind: str = "t3") -> Optional[float]:
+        row = self._conn().execute(
+            "SELECT MAX(created_utc) FROM reddit_things WHERE subreddit=? AND kind=?", (sub.lower(), kind)
+        ).fetchone()
+        return row[0] if row else None
+
+    def modlog_mark(self, sub: str) -> Optional[tuple[str, float]]:
+        row = self._conn().execute("SELECT last_id, last_created FROM reddit_modlog_marks WHERE subreddit=?", (sub.lower(),)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def modlog_stats(self, sub: str, since: float, until: float, mod: Optional[str] = None) -> dict:
+        where, args = ["subreddit=? AND hour>=? AND hour<?"], [sub.lower(), int(since // 3600 * 3600), until]
+        if mod:
+            where.append("mod=?")
+            args.append(mod)
+        rows = self._conn().execute(
+            f"SELECT hour, mod, action, count FROM reddit_modlog_hourly WHERE {' AND '.join(where)} ORDER BY hour, mod, action", args
+        ).fetchall()
+        totals: dict[str, int] = {}
+        for r in rows:
+            totals[r["mod"]] = totals.get(r["mod"], 0) + r["count"]
+        return {"hours": [dict(r) for r in rows], "totals": totals}
+
+    def things(
+        self,
+        sub: str,
+        kind: Optional[str] = None,
+        author: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        after: Optional[str] = None,
+        limit: int = 100,
+    ) -> dict:
+        where, args = ["subreddit=?"], [sub.lower()]
+        if kind:
+            where.append("kind=?")
+            args.append(kind)
+        if author:
+            where.append("author=?")
+            args.append(author)
+        if since is not None:
+            where.append("created_utc>=?")
+            args.append(since)
+        if until is not None:
+            where.append("created_utc<?")
+            args.append(until)
+        if after:
+            # Keyset cursor: continue below the row named by `after`
+            where.append("(created_utc, name) < (SELECT created_utc, name FROM reddit_things WHERE name=?)")
+            args.append(after)
+        rows = self._conn().execute(
+            f"SELECT name, data FROM reddit_things WHERE {' AND '.join(where)} ORDER BY created_utc DESC, name DESC LIMIT ?",
+            (*args, limit),
+        ).fetchall()
+        items = [orjson.loads(r["data"]) for r in rows]
+        return {"items": items, "after": rows[-1]["name"] if len(rows) == limit else None}
+
+    def modlog(
+        self,
+        sub: str,
+        mod: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        after: Optional[str] = None,
+        limit: int = 100,
+    ) -> dict:
+        where, args = ["subreddit=?"], [sub.lower()]
+        for col, val in (("mod", mod), ("action", action)):
+            if val:
+                where.append(f"{col}=?")
+                args.append(val)
+        if since is not None:
+            where.append("created_utc>=?")
+            args.append(since)
+        if until is not None:
+            where.append("created_utc<?")
+            args.append(until)
+        if after:
+            where.append("(created_utc, id) < (SELECT created_utc, id FROM reddit_modlog WHERE id=?)")
+            args.append(after)
+        rows = self._conn().execute(
+            f"SELECT id, data FROM reddit_modlog WHERE {' AND '.join(where)} ORDER BY created_utc DESC, id DESC LIMIT ?",
+            (*args, limit),
+        ).fetchall()
+        return {"items": [orjson.loads(r["data"]) for r in rows], "after": rows[-1]["id"] if len(rows) == limit else None}
+
+    def queue_history(self, profile: str, sub: str, queue: str, since: float, until: float, limit: int = 1000) -> dict:
+        # Items whose time in the queue overlaps [since, until]; resolution is
+        # bounded by how often the queue was fetched (the poller helps here)
+        rows = self._conn().execute(
+            """
+            SELECT q.name, q.first_seen, q.last_seen, t.data
+            FROM reddit_queue_seen q LEFT JOIN reddit_things t ON t.name = q.name
+            WHERE q.profile=? AND q.subreddit=? AND q.queue=? AND q.last_seen>=? AND q.first_seen<=?
+            ORDER BY q.first_seen DESC LIMIT ?
+            """,
+            (profile.lower(), sub.lower(), queue, since, until, limit),
+        ).fetchall()
+        return {
+            "items": [
+                {"name": r["name"], "first_seen": r["first_seen"], "last_seen": r["last_seen"], "thing": orjson.loads(r["data"]) if r["data"] else None}
+                for r in rows
+            ]
+        }
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("reddit_things", "reddit_modlog", "reddit_queue_seen", "reddit_modlog_marks")}
+        return {"path": str(self.path), "writes": self.writes, "errors": self.errors, **counts}
+
+
+def _build() -> ThingStore:
+    path = get_settings().reddit_store_path or db_path().with_name("reddit-store.db")
+    return ThingStore(path)
+
+
+store = _build()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 # pip install fastapi uvicorn[standard] pydantic-settings orjson
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
@@ -8,10 +10,15 @@ from fastapi.responses import ORJSONResponse
 from .settings import get_settings
 from .security.rate_limit import RateLimitMiddleware
 from .security.csrf import CSRFMiddleware, router as csrf_router
+from .security.hmac import BodyDigestMiddleware
 from .db import init_db
 from .domains.auth.router import router as auth_router
 from .domains.files.router import router as files_router
 from .domains.reddit.router import router as reddit_router
+from .domains.reddit.jobs import worker as reddit_jobs
+from .domains.reddit.modlog import syncer as reddit_modlog
+from .domains.reddit.poller import poller as reddit_poller
+from .domains.reddit.rss import rss as reddit_rss
 from .domains.keys.router import router as keys_router
 from .domains.tasks.router import router as tasks_router
 from .domains.ops.router import router as ops_router
@@ -20,6 +27,18 @@ from .domains.ops.router import router as ops_router
 def create_app() -> FastAPI:
     settings = get_settings()
 
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Background workers live for the process; stopped on graceful shutdown
+        reddit_poller.start_configured(settings.reddit_watch)
+        reddit_modlog.start_configured(settings.reddit_modlog_sync)
+        reddit_jobs.start()
+        yield
+        await reddit_jobs.stop()
+        await reddit_poller.stop()
+        await reddit_modlog.stop()
+        await reddit_rss.close()
+
     app = FastAPI(
         title="Moonshit Dashboard API",
         version="0.1.0",
@@ -29,8 +48,13 @@ def create_app() -> FastAPI:
         docs_url="/docs",
         redoc_url="/redoc",
         openapi_url="/openapi.json",
+        lifespan=lifespan,
     )
 
+    # HMAC body hashing as the request streams in (no full-body buffering);
+    # added first so it sits innermost, next to the handler consuming the body
+    app.add_middleware(BodyDigestMiddleware)
+
     # CORS (locked if origin provided)
     if settings.cors_origin:
         app.add_middleware(
@@ -58,10 +82,8 @@ def create_app() -> FastAPI:
         ok = True
         db = "unknown"
         try:
-            from .db import get_conn
-            c = get_conn()
-            c.execute("SELECT 1")
-            c.close()
+            from .db import ping
+            ping()
             db = "ok"
         except Exception:
             ok = False
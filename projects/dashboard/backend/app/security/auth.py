@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 # pip install argon2-cffi itsdangerous
+import threading
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 
 from argon2 import PasswordHasher
@@ -25,21 +28,67 @@ def verify_password(hash_str: str, password: str) -> bool:
         return False
 
 
+@lru_cache(maxsize=1)
 def session_signer() -> URLSafeSerializer:
-    s = URLSafeSerializer(get_settings().secret_key, salt="dash-session")
-    return s
+    # Built once per process rather than for every cookie checked
+    return URLSafeSerializer(get_settings().secret_key, salt="dash-session")
 
 
 SESSION_COOKIE = "dash_session"
 SESSION_MAX_AGE = 24 * 3600
 
 
-@dataclass
+@dataclass(frozen=True)
 class Session:
     user: str
     iat: int
 
 
+class VerifiedCookies:
+    """Small LRU of cookies whose signature already checked out.
+
+    A hit skips itsdangerous entirely; entries are dropped once the session
+    passes ``SESSION_MAX_AGE``, exactly as a fresh decode would reject it.
+    Only valid cookies are stored, so garbage cookies cannot evict them.
+    Locked because sync dependencies resolve sessions on threadpool threads.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, Session] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cookie: str) -> Optional[Session]:
+        with self._lock:
+            sess = self._entries.get(cookie)
+            if sess is None:
+                self.misses += 1
+                return None
+            if time.time() - sess.iat > SESSION_MAX_AGE:
+                del self._entries[cookie]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cookie)
+            self.hits += 1
+            return sess
+
+    def put(self, cookie: str, sess: Session) -> None:
+        with self._lock:
+            self._entries[cookie] = sess
+            self._entries.move_to_end(cookie)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+verified_cookies = VerifiedCookies()
+
+
 def create_session_cookie(user: str) -> str:
     s = session_signer()
     payload = {"u": user, "iat": int(time.time())}
@@ -49,6 +98,9 @@ def create_session_cookie(user: str) -> str:
 def load_session(cookie: Optional[str]) -> Optional[Session]:
     if not cookie:
         return None
+    sess = verified_cookies.get(cookie)
+    if sess is not None:
+        return sess
     try:
         data = session_signer().loads(cookie)
     except BadSignature:
@@ -56,7 +108,21 @@ def load_session(cookie: Optional[str]) -> Optional[Session]:
     iat = int(data.get("iat", 0))
     if time.time() - iat > SESSION_MAX_AGE:
         return None
-    return Session(user=data.get("u", ""), iat=iat)
+    sess = Session(user=data.get("u", ""), iat=iat)
+    verified_cookies.put(cookie, sess)
+    return sess
+
+
+_UNLOADED = object()
+
+
+def request_session(request: Request) -> Optional[Session]:
+    # Decoded once per request and kept on request.state; the CSRF middleware,
+    # auth dependencies and handlers all share it
+    sess = getattr(request.state, "session", _UNLOADED)
+    if sess is _UNLOADED:
+        sess = request.state.session = load_session(request.cookies.get(SESSION_COOKIE))
+    return sess
 
 
 # Simple in-memory lockouts; swap with Redis in prod
@@ -89,7 +155,7 @@ def clear_failures(user: str, ip: str) -> None:
 
 # Dependencies
 def require_session(request: Request) -> Session:
-    sess = load_session(request.cookies.get(SESSION_COOKIE))
+    sess = request_session(request)
     if not sess:
         raise HTTPException(status_code=http.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     return sess
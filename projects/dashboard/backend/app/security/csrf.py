@@ -2,13 +2,13 @@ from __future__ import annotations
 
 import hmac
 import hashlib
-from typing import Callable
+from functools import lru_cache
 
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from .auth import SESSION_COOKIE, load_session
+from .auth import request_session
 from ..settings import get_settings
 
 
@@ -16,22 +16,33 @@ def _sign(value: str, secret: str) -> str:
     return hmac.new(secret.encode(), value.encode(), hashlib.sha256).hexdigest()
 
 
+@lru_cache(maxsize=256)
 def issue_csrf_token(user: str) -> str:
     # Token derived from user + secret; stateless
     secret = get_settings().secret_key
     return _sign(f"csrf:{user}", secret)
 
 
-class CSRFMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable):
+UNSAFE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+class CSRFMiddleware:
+    """Pure ASGI: safe methods and non-HTTP scopes pass through untouched."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         # Only protect state-changing methods for cookie-based sessions
-        if request.method in {"POST", "PUT", "PATCH", "DELETE"}:
-            sess = load_session(request.cookies.get(SESSION_COOKIE))
+        if scope["type"] == "http" and scope["method"] in UNSAFE_METHODS:
+            request = Request(scope)
+            sess = request_session(request)
             if sess:
                 supplied = request.headers.get("X-CSRF-Token")
                 if not supplied or supplied != issue_csrf_token(sess.user):
-                    return JSONResponse({"detail": "Invalid CSRF token"}, status_code=403)
-        return await call_next(request)
+                    response = JSONResponse({"detail": "Invalid CSRF token"}, status_code=403)
+                    return await response(scope, receive, send)
+        await self.app(scope, receive, send)
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])  # unified with auth namespace
@@ -39,7 +50,7 @@ router = APIRouter(prefix="/auth", tags=["auth"])  # unified with auth namespace
 
 @router.get("/csrf")
 def get_csrf(request: Request):
-    sess = load_session(request.cookies.get(SESSION_COOKIE))
+    sess = request_session(request)
     if not sess:
         return JSONResponse({"detail": "Not authenticated"}, status_code=401)
     return {"token": issue_csrf_token(sess.user)}
@@ -2,31 +2,33 @@ from __future__ import annotations
 
 from typing import List
 
-from fastapi import Depends, HTTPException
+from fastapi import HTTPException
 from fastapi import status as http
 
 from fastapi import Request
-from .auth import load_session
-from .hmac import require_hmac, HMACCredentials
+from .auth import request_session
+from .hmac import request_auth, require_hmac
 
 
 def require_user_or_hmac(required_scopes: List[str]):
-    # OR dependency: returns True if session cookie is valid OR HMAC header valid with scopes
-    async def wrapper(request: Request, hmac_result=Depends(_try_hmac(required_scopes))):
-        sess = load_session(request.cookies.get("dash_session"))
-        if sess or hmac_result:
+    # OR dependency: returns True if session cookie is valid OR HMAC header valid with scopes.
+    # The session is checked first so cookie callers never hit HMAC verification.
+    check_hmac = require_hmac(required_scopes)
+
+    async def wrapper(request: Request):
+        if request_session(request):
+            return True
+        if request_auth(request):
+            await check_hmac(request)
             return True
         raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Auth required")
 
     return wrapper
 
 
-async def _try_session():
-    return False
-
-
-def _try_hmac(required_scopes: List[str]):
-    async def inner(_: HMACCredentials = Depends(require_hmac(required_scopes))):
+def has_scope(request: Request, scope: str) -> bool:
+    # For routes whose dependency only proves the base scope: sessions may do
+    # everything, HMAC callers only what their verified key grants
+    if request_session(request):
         return True
-
-    return inner
+    return scope in getattr(request.state, "hmac_scopes", ())
@@ -4,15 +4,19 @@ from __future__ import annotations
 import base64
 import hashlib
 import hmac
+import re
 import time
 import uuid
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional
 
-from fastapi import Depends, HTTPException, Request
+from fastapi import HTTPException, Request
 from fastapi import status as http
 from cryptography.fernet import Fernet  # pip install cryptography
 from ..settings import get_settings
-from ..db import lookup_api_key, create_api_key
+from ..db import api_key_generation, lookup_api_key, create_api_key, run as run_db
+from .nonces import build_nonce_store
 
 
 class HMACCredentials:
@@ -24,7 +28,126 @@ class HMACCredentials:
         self.scope_ok = scope_ok
 
 
-_nonce_cache: set[str] = set()
+MAX_SKEW = 300  # seconds a signed timestamp may differ from our clock
+
+# Nonces are kept until their timestamp falls outside MAX_SKEW
+nonces = build_nonce_store(MAX_SKEW)
+
+
+@lru_cache(maxsize=1)
+def _fernet() -> Fernet:
+    # Derived from DASH_SECRET_KEY once per process rather than per request
+    key = hashlib.sha256(get_settings().secret_key.encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+class KeyRecord:
+    """Decoded API key: parsed scopes and an HMAC already keyed with the secret."""
+
+    __slots__ = ("key_id", "scopes", "error", "loaded", "_mac")
+
+    def __init__(self, key_id: str, scopes: frozenset, mac: Optional["hmac.HMAC"], error: Optional[str] = None):
+        self.key_id = key_id
+        self.scopes = scopes
+        self.error = error  # set when the key exists but cannot verify (e.g. undecryptable secret)
+        self.loaded = time.monotonic()
+        self._mac = mac
+
+    def sign(self, canonical: bytes) -> str:
+        mac = self._mac.copy()
+        mac.update(canonical)
+        return base64.b64encode(mac.digest()).decode()
+
+
+class KeyCache:
+    """Per-worker cache of API key records.
+
+    Known keys sit in an LRU of ``maxsize`` records. Lookups that found nothing
+    go to a separate, smaller LRU of ``negative`` key ids, so a client cycling
+    through made-up ids churns only that one and never evicts real keys.
+    Entries live for ``ttl`` seconds. Every ``check_every`` seconds one request
+    reads the DB's key generation counter, which create/revoke bump; a change
+    drops both caches, so a revocation reaches every worker within
+    ``check_every`` seconds without a query per request.
+    """
+
+    def __init__(self, ttl: float, check_every: float, maxsize: int = 10000, negative: int = 1000):
+        self.ttl = ttl
+        self.check_every = check_every
+        self.maxsize = maxsize
+        self.negative = negative
+        self._entries: OrderedDict[str, KeyRecord] = OrderedDict()
+        self._missing: OrderedDict[str, float] = OrderedDict()  # key id -> when the lookup came back empty
+        self._gen: Optional[int] = None
+        self._checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    async def get(self, key_id: str) -> Optional[KeyRecord]:
+        now = time.monotonic()
+        if now - self._checked >= self.check_every:
+            self._checked = now  # claim the check so concurrent requests skip it
+            gen = await run_db(api_key_generation)
+            if gen != self._gen:
+                if self._gen is not None:
+                    self.flushes += 1
+                self._entries.clear()
+                self._missing.clear()
+                self._gen = gen
+        rec = self._entries.get(key_id)
+        if rec is not None and now - rec.loaded < self.ttl:
+            self._entries.move_to_end(key_id)
+            self.hits += 1
+            return rec
+        missing_since = self._missing.get(key_id)
+        if missing_since is not None and now - missing_since < self.ttl:
+            self._missing.move_to_end(key_id)
+            self.hits += 1
+            return None
+        self.misses += 1
+        rec = await run_db(_load_key, key_id)
+        self._entries.pop(key_id, None)
+        self._missing.pop(key_id, None)
+        if rec is None:
+            _remember(self._missing, key_id, time.monotonic(), self.negative)
+        else:
+            _remember(self._entries, key_id, rec, self.maxsize)
+        return rec
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "missing": len(self._missing),
+            "hits": self.hits,
+            "misses": self.misses,
+            "flushes": self.flushes,
+            "generation": self._gen,
+        }
+
+
+def _remember(lru: OrderedDict, key: str, value, maxsize: int) -> None:
+    lru[key] = value
+    if len(lru) > maxsize:
+        lru.popitem(last=False)
+
+
+def _load_key(key_id: str) -> Optional[KeyRecord]:
+    rec = lookup_api_key(key_id)
+    if not rec:
+        return None
+    scopes = frozenset(filter(None, (rec.get("scopes") or "").split(",")))
+    enc = rec.get("secret_enc")
+    if not enc:
+        return KeyRecord(key_id, scopes, None, "Secret not available for verification")
+    try:
+        secret = _fernet().decrypt(enc)
+    except Exception:
+        return KeyRecord(key_id, scopes, None, "Secret invalid")
+    return KeyRecord(key_id, scopes, hmac.new(secret, digestmod=hashlib.sha256))
+
+
+key_cache = KeyCache(get_settings().api_key_cache_ttl, get_settings().api_key_revocation_check)
 
 
 def _hash_secret(secret: str) -> str:
@@ -44,10 +167,115 @@ def parse_auth_header(value: str) -> Optional[dict[str, str]]:
     return data
 
 
+DIGEST_HEADER = "X-Content-SHA256"
+_HEX_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+class BodyDigest:
+    """SHA-256 of a request body, fed as the app consumes the ASGI receive stream.
+
+    When the client declared the digest up front (``X-Content-SHA256``) the
+    final chunk is checked against it; a mismatch raises out of ``receive`` so
+    whatever is reading the body (form parsing, ``request.stream()``) aborts.
+    """
+
+    __slots__ = ("expected", "done", "size", "_sha")
+
+    def __init__(self, expected: Optional[str] = None):
+        self.expected = expected
+        self.done = False
+        self.size = 0
+        self._sha = hashlib.sha256()
+
+    def feed(self, chunk: bytes, more: bool) -> None:
+        if chunk:
+            self._sha.update(chunk)
+            self.size += len(chunk)
+        if not more:
+            self.done = True
+            if self.expected is not None and not hmac.compare_digest(self._sha.hexdigest(), self.expected):
+                raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Body digest mismatch")
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+class BodyDigestMiddleware:
+    """Hash HMAC-signed request bodies incrementally instead of buffering them.
+
+    Pure ASGI so it can wrap ``receive``: only requests carrying an
+    ``Authorization: HMAC`` header pay for hashing, and ``require_hmac`` reads
+    the digest from ``request.state.body_digest`` rather than calling
+    ``request.body()``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        auth = expected = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth = value
+            elif name == b"x-content-sha256":
+                expected = value.decode("latin-1").strip().lower()
+        if auth is None or not auth.startswith(b"HMAC "):
+            return await self.app(scope, receive, send)
+        digest = BodyDigest(expected if expected and _HEX_DIGEST.fullmatch(expected) else None)
+        scope.setdefault("state", {})["body_digest"] = digest
+
+        async def hashing_receive():
+            message = await receive()
+            if message["type"] == "http.request" and not digest.done:
+                digest.feed(message.get("body", b""), message.get("more_body", False))
+            return message
+
+        await self.app(scope, hashing_receive, send)
+
+
+async def _body_hash(request: Request) -> str:
+    digest: Optional[BodyDigest] = getattr(request.state, "body_digest", None)
+    declared = request.headers.get(DIGEST_HEADER)
+    if declared is not None:
+        declared = declared.strip().lower()
+        if not _HEX_DIGEST.fullmatch(declared):
+            raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail=f"Invalid {DIGEST_HEADER}")
+        if digest is not None:
+            # Signed over the declared digest; the middleware checks the body
+            # against it when the handler reaches the end of the stream
+            return declared
+    if digest is None:
+        # Middleware not installed: fall back to buffering the body
+        body_hash = hashlib.sha256(await request.body()).hexdigest()
+        if declared is not None and not hmac.compare_digest(body_hash, declared):
+            raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Body digest mismatch")
+        return declared or body_hash
+    if not digest.done:
+        # Nothing has read the body yet (GET, or a handler reading it itself);
+        # draining it here goes through the hashing receive
+        await request.body()
+    return digest.hexdigest()
+
+
+_UNPARSED = object()
+
+
+def request_auth(request: Request) -> Optional[dict[str, str]]:
+    # Parsed once per request and kept on request.state; the rate limiter
+    # reads keyId from it before require_hmac runs
+    parsed = getattr(request.state, "hmac_auth", _UNPARSED)
+    if parsed is _UNPARSED:
+        parsed = request.state.hmac_auth = parse_auth_header(request.headers.get("Authorization"))
+    return parsed
+
+
 def require_hmac(required_scopes: list[str]):
+    required = frozenset(required_scopes)
+
     async def dep(request: Request) -> HMACCredentials:
-        hdr = request.headers.get("Authorization")
-        parsed = parse_auth_header(hdr)
+        parsed = request_auth(request)
         if not parsed:
             raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Missing HMAC header")
 
@@ -58,70 +286,45 @@ def require_hmac(required_scopes: list[str]):
         if not key_id or not ts_str or not nonce or not sig:
             raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Invalid HMAC header")
 
-        if nonce in _nonce_cache:
-            raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Replay detected")
         try:
             ts = int(ts_str)
         except ValueError:
             raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Bad timestamp")
 
-        if abs(time.time() - ts) > 300:
+        if abs(time.time() - ts) > MAX_SKEW:
             raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Timestamp skew too large")
 
-        rec = lookup_api_key(key_id)
-        if not rec:
+        rec = await key_cache.get(key_id)
+        if rec is None:
             raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Unknown key")
-        scopes = set((rec.get("scopes") or "").split(","))
+        if rec.error:
+            raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail=rec.error)
 
-        body_bytes = await request.body()
-        body_hash = hashlib.sha256(body_bytes or b"").hexdigest()
+        body_hash = await _body_hash(request)
         canonical = "|".join([request.method.upper(), request.url.path, str(ts), nonce, body_hash])
-        # We cannot recover the secret from hash; for verification we need the raw secret.
-        # Expect clients to send correct signature with their secret; server verifies via derived request.
-        # For this scaffold, we temporarily store a transient map of key_id->secret for issued keys
-        # to support verification without a full KMS. On production, load from a secure secrets vault.
-        secret_bytes = _ISSUED_SECRETS.get(key_id)
-        if not secret_bytes:
-            enc = rec.get("secret_enc")
-            if enc:
-                # Derive Fernet key from DASH_SECRET_KEY
-                key = hashlib.sha256(get_settings().secret_key.encode()).digest()
-                fkey = base64.urlsafe_b64encode(key)
-                f = Fernet(fkey)
-                try:
-                    secret_bytes = f.decrypt(enc)
-                except Exception:
-                    raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Secret invalid")
-            else:
-                raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Secret not available for verification")
-        expected = base64.b64encode(hmac.new(secret_bytes, canonical.encode(), hashlib.sha256).digest()).decode()
-        if not hmac.compare_digest(expected, sig):
+        if not hmac.compare_digest(rec.sign(canonical.encode()), sig):
             raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Bad signature")
 
-        # Nonce memory cache (short-lived); in prod use Redis with TTL
-        _nonce_cache.add(nonce)
-        if len(_nonce_cache) > 10000:
-            _nonce_cache.clear()
+        # Recorded only once the signature checks out, so forged requests
+        # cannot fill the store
+        if not await nonces.check_and_add(nonce, ts):
+            raise HTTPException(http.HTTP_401_UNAUTHORIZED, detail="Replay detected")
 
-        scope_ok = all(s in scopes for s in required_scopes)
+        scope_ok = required <= rec.scopes
         if not scope_ok:
             raise HTTPException(http.HTTP_403_FORBIDDEN, detail="Insufficient scope")
+        # Kept for handlers that gate individual operations (see deps.has_scope)
+        request.state.hmac_scopes = rec.scopes
 
         return HMACCredentials(key_id, ts, nonce, sig, scope_ok)
 
     return dep
 
 
-_ISSUED_SECRETS: dict[str, bytes] = {}
-
 def new_key(scopes: list[str]) -> tuple[str, str]:
     kid = uuid.uuid4().hex
     secret = uuid.uuid4().hex + uuid.uuid4().hex
     # Encrypt secret for verification and store hash for audit
-    key = hashlib.sha256(get_settings().secret_key.encode()).digest()
-    fkey = base64.urlsafe_b64encode(key)
-    f = Fernet(fkey)
-    enc = f.encrypt(secret.encode())
+    enc = _fernet().encrypt(secret.encode())
     create_api_key(kid, _hash_secret(secret), scopes, secret_enc=enc)
-    _ISSUED_SECRETS[kid] = secret.encode()
     return kid, secret
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+# Replay protection for HMAC requests: a nonce is remembered until its
+# timestamp can no longer pass the skew check, then dropped
+import math
+import time
+from collections import deque
+
+from .. import db
+from ..settings import get_settings
+
+
+BUCKET_SECONDS = 10.0  # expiry granularity; nonces outlive their window by at most this
+
+
+class MemoryNonces:
+    """Per-worker nonce set with time-bucketed expiry.
+
+    Each nonce expires at ``ts + window`` (later timestamps cannot pass the skew
+    check anyway). Expiry times are rounded up to ``bucket`` seconds and kept in
+    a ring of buckets, so insert and lookup are a dict operation and expiring
+    drops whole buckets. Memory is bounded by request rate x (2 x window), since
+    accepted timestamps span ``now +- window``.
+    """
+
+    def __init__(self, window: float, bucket: float = BUCKET_SECONDS):
+        self.window = window
+        self.bucket = bucket
+        self._expiry: dict[str, int] = {}  # nonce -> bucket index
+        self._ring: deque[tuple[int, list[str]]] = deque()  # (bucket index, nonces) ascending
+        self.accepted = 0
+        self.replays = 0
+        self.expired = 0
+
+    def _expire(self, now: float) -> None:
+        current = int(now // self.bucket)
+        ring = self._ring
+        while ring and ring[0][0] < current:
+            _, nonces = ring.popleft()
+            for n in nonces:
+                del self._expiry[n]
+            self.expired += len(nonces)
+
+    def _slot(self, index: int) -> list[str]:
+        # Buckets arrive almost in order; walk from the newest end
+        ring = self._ring
+        if not ring or ring[-1][0] < index:
+            ring.append((index, []))
+            return ring[-1][1]
+        for i in range(len(ring) - 1, -1, -1):
+            if ring[i][0] == index:
+                return ring[i][1]
+            if ring[i][0] < index:
+                ring.insert(i + 1, (index, []))
+                return ring[i + 1][1]
+        ring.appendleft((index, []))
+        return ring[0][1]
+
+    async def check_and_add(self, nonce: str, ts: float) -> bool:
+        """Record ``nonce``; False when it was already seen (a replay)."""
+        now = time.time()
+        self._expire(now)
+        if nonce in self._expiry:
+            self.replays += 1
+            return False
+        index = math.ceil((ts + self.window) / self.bucket)
+        self._expiry[nonce] = index
+        self._slot(index).append(nonce)
+        self.accepted += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._expiry),
+            "buckets": len(self._ring),
+            "accepted": self.accepted,
+            "replays": self.replays,
+            "expired": self.expired,
+        }
+
+
+class SQLiteNonces:
+    """Nonces in the main database so every worker sees the same set.
+
+    ``INSERT OR IGNORE`` on the primary key is the atomic check-and-add. Rows
+    past their expiry are deleted once per ``bucket`` seconds by whichever
+    request gets there first.
+    """
+
+    def __init__(self, window: float, bucket: float = BUCKET_SECONDS):
+        self.window = window
+        self.bucket = bucket
+        self._pruned = 0.0
+        self.accepted = 0
+        self.replays = 0
+        self.expired = 0
+
+    async def check_and_add(self, nonce: str, ts: float) -> bool:
+        now = time.time()
+        prune = now - self._pruned >= self.bucket
+        if prune:
+            self._pruned = now
+        fresh, removed = await db.run(db.remember_nonce, nonce, ts + self.window, now if prune else None)
+        self.expired += removed
+        if not fresh:
+            self.replays += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sqlite",
+            "size": db.nonce_count(),
+            "accepted": self.accepted,
+            "replays": self.replays,
+            "expired": self.expired,
+        }
+
+
+def build_nonce_store(window: float) -> MemoryNonces | SQLiteNonces:
+    backend = get_settings().hmac_nonce_backend.lower()
+    if backend == "sqlite":
+        return SQLiteNonces(window)
+    if backend != "memory":
+        raise ValueError(f"unknown DASH_HMAC_NONCE_BACKEND: {backend}")
+    return MemoryNonces(window)
@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import logging
+import math
+import sqlite3
+import threading
 import time
-from typing import Callable, Optional
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
 
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.requests import Request
-from starlette.responses import JSONResponse, Response
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..settings import get_settings
+from .hmac import request_auth
+
+
+log = logging.getLogger(__name__)
 
 
 def parse_rate(rate: str) -> tuple[int, float]:
@@ -25,71 +37,232 @@ def parse_rate(rate: str) -> tuple[int, float]:
     return n, window
 
 
-class TokenBucket:
-    def __init__(self, capacity: int, refill_seconds: float):
-        self.capacity = capacity
-        self.tokens = float(capacity)
-        self.refill_seconds = refill_seconds
-        self.updated = time.monotonic()
+class RateDecision(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: float  # seconds until the full burst is available again
+    retry_after: float  # seconds until the next request would pass (0 when allowed)
+
+
+def _gcra(tat: Optional[float], now: float, capacity: int, window: float) -> tuple[RateDecision, Optional[float]]:
+    # Generic cell rate algorithm: one "theoretical arrival time" per key.
+    # Equivalent to a token bucket of ``capacity`` refilled over ``window``.
+    interval = window / capacity
+    tat = now if tat is None or tat < now else tat
+    new = tat + interval
+    if new - now > window:
+        return RateDecision(False, capacity, 0, tat - now, new - window - now), None
+    return RateDecision(True, capacity, int((window - (new - now)) / interval + 1e-9), new - now, 0.0), new
+
+
+class MemoryBackend:
+    """Per-worker limiter state: one float per key, bounded by ``max_keys``.
+
+    The dict doubles as an LRU: a key is re-inserted on every check, so the
+    front holds the least recently seen clients. Each check drops up to two
+    entries from the front that are back at full capacity (indistinguishable
+    from a new key), or, once over ``max_keys``, regardless.
+    """
+
+    __slots__ = ("max_keys", "_tat", "allowed", "limited", "expired", "evicted")
+    name = "memory"
 
-    def allow(self) -> bool:
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tat: dict[str, float] = {}
+        self.allowed = 0
+        self.limited = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def check(self, key: str, capacity: int, window: float) -> RateDecision:
         now = time.monotonic()
-        elapsed = now - self.updated
-        self.updated = now
-        self.tokens = min(self.capacity, self.tokens + elapsed * (self.capacity / self.refill_seconds))
-        if self.tokens >= 1.0:
-            self.tokens -= 1.0
-            return True
-        return False
-
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, default_rate: str = "60/minute", key_fn: Optional[Callable[[Request], str]] = None, groups: Optional[dict[str, str]] = None):
-        super().__init__(app)
-        self.capacity, self.window = parse_rate(default_rate)
-        self.buckets: dict[str, TokenBucket] = {}
+        tat = self._tat.pop(key, None)
+        decision, new = _gcra(tat, now, capacity, window)
+        if new is None:
+            self.limited += 1
+            self._tat[key] = tat  # a rejected key is always mid-window
+        else:
+            self.allowed += 1
+            self._tat[key] = new
+        self._evict(now)
+        return decision
+
+    def _evict(self, now: float) -> None:
+        tats = self._tat
+        for _ in range(2):
+            oldest = next(iter(tats))
+            if tats[oldest] <= now:
+                self.expired += 1
+            elif len(tats) > self.max_keys:
+                self.evicted += 1
+            else:
+                return
+            del tats[oldest]
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "keys": len(self._tat),
+            "max_keys": self.max_keys,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+class SQLiteBackend:
+    """Limiter state in a shared SQLite file so limits hold across gunicorn workers.
+
+    The GCRA step is a single upsert whose ``WHERE`` only lets the update
+    through when the request conforms, so concurrent workers cannot both spend
+    the last slot. Calls run inline on the event loop, since a WAL autocommit
+    write is cheaper than an executor hop. To bound how long that can block the
+    loop, the busy timeout is only ``BUSY_TIMEOUT``. A request that cannot get
+    the write lock in time is let through and counted in ``failed_open``.
+    """
+
+    name = "sqlite"
+    PRUNE_EVERY = 60.0
+    BUSY_TIMEOUT = 0.005
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self._pruned = 0.0
+        self.allowed = 0
+        self.limited = 0
+        self.expired = 0
+        self.failed_open = 0
+        self._conn().execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.BUSY_TIMEOUT * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def check(self, key: str, capacity: int, window: float) -> RateDecision:
+        try:
+            return self._check(key, capacity, window)
+        except sqlite3.OperationalError as e:
+            # Locked past BUSY_TIMEOUT: admitting beats stalling every request on this worker
+            self.failed_open += 1
+            log.warning("rate limit store unavailable, allowing request: %s", e)
+            return RateDecision(True, capacity, capacity - 1, 0.0, 0.0)
+
+    def _check(self, key: str, capacity: int, window: float) -> RateDecision:
+        conn = self._conn()
+        now = time.time()
+        interval = window / capacity
+        if now - self._pruned >= self.PRUNE_EVERY:
+            # Keys whose arrival time has passed are back at full capacity
+            self._pruned = now
+            self.expired += conn.execute("DELETE FROM rate_limits WHERE tat<?", (now,)).rowcount
+        row = conn.execute(
+            """
+            INSERT INTO rate_limits (key, tat) VALUES (?1, ?2 + ?3)
+            ON CONFLICT (key) DO UPDATE SET tat = max(tat, ?2) + ?3
+            WHERE max(tat, ?2) + ?3 - ?2 <= ?4
+            RETURNING tat
+            """,
+            (key, now, interval, window),
+        ).fetchone()
+        if row is not None:
+            self.allowed += 1
+            new = row[0]
+            return RateDecision(True, capacity, int((window - (new - now)) / interval + 1e-9), new - now, 0.0)
+        self.limited += 1
+        row = conn.execute("SELECT tat FROM rate_limits WHERE key=?", (key,)).fetchone()
+        return _gcra(row[0] if row else None, now, capacity, window)[0]
+
+    def stats(self) -> dict:
+        keys = self._conn().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+        return {
+            "backend": self.name,
+            "keys": keys,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "expired": self.expired,
+            "failed_open": self.failed_open,
+        }
+
+
+def _build() -> MemoryBackend | SQLiteBackend:
+    s = get_settings()
+    return SQLiteBackend(s.rate_limit_path) if s.rate_limit_path else MemoryBackend(s.rate_limit_max_keys)
+
+
+limiter = _build()
+
+
+class _Limit(NamedTuple):
+    capacity: int
+    window: float
+    tag: str  # "capacity/window" suffix of the bucket key
+
+
+def _limit(rate: str) -> _Limit:
+    capacity, window = parse_rate(rate)
+    return _Limit(capacity, window, f"{capacity}/{int(window)}")
+
+
+class RateLimitMiddleware:
+    """Pure ASGI so responses (file downloads, SSE) stream straight through."""
+
+    def __init__(self, app: ASGIApp, default_rate: str = "60/minute", key_fn: Optional[Callable[[Request], str]] = None, groups: Optional[dict[str, str]] = None, backend: Optional[MemoryBackend | SQLiteBackend] = None):
+        self.app = app
+        self.default = _limit(default_rate)
+        self.backend = backend or limiter
         self.key_fn = key_fn or (lambda r: r.client.host if r.client else "unknown")
-        # Path prefix -> rate string
-        self.groups = groups or {}
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Pick group by longest matching prefix
-        capacity = self.capacity
-        window = self.window
-        if self.groups:
-            path = request.url.path
-            match = ""
-            for prefix, rate in self.groups.items():
-                if path.startswith(prefix) and len(prefix) > len(match):
-                    match = prefix
-                    c, w = parse_rate(rate)
-                    capacity, window = c, w
-
-        # Include API key if present in Authorization HMAC header
-        auth = request.headers.get("Authorization", "")
-        kid = ""
-        if auth.startswith("HMAC "):
-            for part in auth[5:].split(','):
-                part = part.strip()
-                if part.startswith("keyId="):
-                    kid = part.split("=", 1)[1]
-                    break
-        key = f"{self.key_fn(request)}|{kid}|{capacity}/{int(window)}"
-        bucket = self.buckets.get(key)
-        if bucket is None:
-            bucket = self.buckets[key] = TokenBucket(capacity, window)
-
-        if not bucket.allow():
-            retry = 1
-            return JSONResponse(
+        # Path prefix -> rate string, compiled once into a longest-first table
+        # so the first hit is the longest matching prefix
+        self.groups = sorted(((prefix, _limit(rate)) for prefix, rate in (groups or {}).items()), key=lambda g: len(g[0]), reverse=True)
+
+    def limit_for(self, path: str) -> _Limit:
+        for prefix, limit in self.groups:
+            if path.startswith(prefix):
+                return limit
+        return self.default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        limit = self.limit_for(scope["path"])
+        # Include API key if present; the parse is kept for require_hmac
+        auth = request_auth(request)
+        kid = auth.get("keyId", "") if auth else ""
+        key = f"{self.key_fn(request)}|{kid}|{limit.tag}"
+        decision = self.backend.check(key, limit.capacity, limit.window)
+        headers = {
+            "X-RateLimit-Limit": str(decision.limit),
+            "X-RateLimit-Remaining": str(decision.remaining),
+            "X-RateLimit-Reset": str(math.ceil(decision.reset)),
+        }
+        if not decision.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+            response = JSONResponse(
                 {
                     "detail": "Rate limit exceeded",
                 },
                 status_code=429,
-                headers={"Retry-After": str(retry), "X-RateLimit-Limit": str(capacity), "X-RateLimit-Remaining": "0"},
+                headers=headers,
             )
+            return await response(scope, receive, send)
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                resp_headers = MutableHeaders(scope=message)
+                for name, value in headers.items():
+                    resp_headers.setdefault(name, value)
+            await send(message)
 
-        resp = await call_next(request)
-        # Approximate remaining tokens (not exact across workers)
-        resp.headers.setdefault("X-RateLimit-Limit", str(capacity))
-        return resp
+        await self.app(scope, receive, send_with_headers)
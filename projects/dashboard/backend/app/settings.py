@@ -23,6 +23,10 @@ class Settings(BaseSettings):
 
     # Rates and uploads
     rate_default: str = Field(default="60/minute", env="RATE_DEFAULT")
+    # Shared SQLite file for rate limit state; unset keeps limits per worker
+    rate_limit_path: Optional[Path] = Field(default=None, env="RATE_LIMIT_PATH")
+    # Per-worker cap on tracked clients; least recently seen are dropped first
+    rate_limit_max_keys: int = Field(default=100_000, env="RATE_LIMIT_MAX_KEYS")
     upload_max_mb: int = Field(default=50, env="UPLOAD_MAX_MB")
     upload_unrestricted: bool = Field(default=True, env="UPLOAD_UNRESTRICTED")
 
@@ -33,6 +37,45 @@ class Settings(BaseSettings):
     # Files
     data_root: Path = Field(default=Path("/srv/dash-data"), env="DATA_ROOT")
 
+    # SQLite (DASH_DB_PATH): pooled connections per process and how long a writer waits for the lock
+    db_pool_size: int = Field(default=8, env="DB_POOL_SIZE")
+    db_busy_timeout: float = Field(default=5.0, env="DB_BUSY_TIMEOUT")
+
+    # API keys: per-worker cache lifetime, and how often workers check for revocations
+    api_key_cache_ttl: float = Field(default=300.0, env="API_KEY_CACHE_TTL")
+    api_key_revocation_check: float = Field(default=1.0, env="API_KEY_REVOCATION_CHECK")
+    # HMAC replay nonces: "memory" (per worker) or "sqlite" (shared by all workers via DASH_DB_PATH)
+    hmac_nonce_backend: str = Field(default="memory", env="HMAC_NONCE_BACKEND")
+
+    # Reddit
+    reddit_max_workers: int = Field(default=32, env="REDDIT_MAX_WORKERS")
+    reddit_profile_concurrency: int = Field(default=8, env="REDDIT_PROFILE_CONCURRENCY")
+    # Max expected queueing delay before answering 429 instead of waiting
+    reddit_slo_seconds: float = Field(default=5.0, env="REDDIT_SLO_SECONDS")
+    reddit_bulk_slo_seconds: float = Field(default=120.0, env="REDDIT_BULK_SLO_SECONDS")
+    # Max concurrent actions per /mod/batch request (still bounded by the per-profile limit)
+    reddit_batch_concurrency: int = Field(default=4, env="REDDIT_BATCH_CONCURRENCY")
+    # Proxy batches: calls in flight across all batches, and per-call timeout
+    reddit_proxy_concurrency: int = Field(default=16, env="REDDIT_PROXY_CONCURRENCY")
+    reddit_proxy_timeout: float = Field(default=15.0, env="REDDIT_PROXY_TIMEOUT")
+    # Queued writes (submit/comment/message): worker tasks per process and attempts per job
+    reddit_job_workers: int = Field(default=2, env="REDDIT_JOB_WORKERS")
+    reddit_job_attempts: int = Field(default=5, env="REDDIT_JOB_ATTEMPTS")
+    # Server-side queue poller: cadence and always-on watches ("profile:sub:queue,profile::inbox")
+    reddit_poll_seconds: float = Field(default=15.0, env="REDDIT_POLL_SECONDS")
+    reddit_watch: str = Field(default="", env="REDDIT_WATCH")
+    # Consecutive API failures before a subreddit's listings switch to RSS, and for how long
+    reddit_breaker_threshold: int = Field(default=3, env="REDDIT_BREAKER_THRESHOLD")
+    reddit_breaker_cooldown: float = Field(default=60.0, env="REDDIT_BREAKER_COOLDOWN")
+    # Incremental mod log sync into the local store: cadence and "profile:sub,..." to sync
+    reddit_modlog_seconds: float = Field(default=300.0, env="REDDIT_MODLOG_SECONDS")
+    reddit_modlog_sync: str = Field(default="", env="REDDIT_MODLOG_SYNC")
+    reddit_cache_max_mb: int = Field(default=64, env="REDDIT_CACHE_MAX_MB")
+    # Optional SQLite file shared by all workers as a second cache tier
+    reddit_cache_path: Optional[Path] = Field(default=None, env="REDDIT_CACHE_PATH")
+    # Local history of fetched things/modlog/queue sightings (defaults next to the main DB)
+    reddit_store_path: Optional[Path] = Field(default=None, env="REDDIT_STORE_PATH")
+
     # CORS
     cors_origin: Optional[str] = Field(default=None, env="CORS_ORIGIN")
 
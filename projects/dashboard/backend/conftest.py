@@ -0,0 +1,8 @@
+# Test settings must be in place before app modules read get_settings()
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="dash-tests-")
+os.environ.setdefault("DASH_ENV", "test")
+os.environ.setdefault("DASH_DB_PATH", os.path.join(_tmp, "dash.db"))
+os.environ.setdefault("DASH_DATA_ROOT", os.path.join(_tmp, "data"))
@@ -0,0 +1,191 @@
+"""Per-request overhead of the rate limit + CSRF middleware stack.
+
+Drives the ASGI app in-process (no sockets), so the numbers are middleware
+cost only. "before" is the original BaseHTTPMiddleware pair (token buckets,
+copied below so the comparison survives in-tree), "after" the pure ASGI
+middleware the app uses now. Run from the backend directory:
+
+    python scripts/bench_middleware.py [-n 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.security.auth import SESSION_COOKIE, create_session_cookie, load_session  # noqa: E402
+from app.security.csrf import CSRFMiddleware, issue_csrf_token  # noqa: E402
+from app.security.rate_limit import MemoryBackend, RateLimitMiddleware, parse_rate  # noqa: E402
+
+CHUNK = b"x" * 65536
+
+
+# --- before: the BaseHTTPMiddleware implementations this stack replaced ---
+
+
+class _TokenBucket:
+    def __init__(self, capacity: int, refill_seconds: float):
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.refill_seconds = refill_seconds
+        self.updated = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * (self.capacity / self.refill_seconds))
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class BaselineRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, default_rate: str = "60/minute"):
+        super().__init__(app)
+        self.capacity, self.window = parse_rate(default_rate)
+        self.buckets: dict[str, _TokenBucket] = {}
+
+    async def dispatch(self, request: Request, call_next: Callable):
+        capacity, window = self.capacity, self.window
+        auth = request.headers.get("Authorization", "")
+        kid = ""
+        if auth.startswith("HMAC "):
+            for part in auth[5:].split(","):
+                part = part.strip()
+                if part.startswith("keyId="):
+                    kid = part.split("=", 1)[1]
+                    break
+        host = request.client.host if request.client else "unknown"
+        key = f"{host}|{kid}|{capacity}/{int(window)}"
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = _TokenBucket(capacity, window)
+        if not bucket.allow():
+            return JSONResponse(
+                {"detail": "Rate limit exceeded"},
+                status_code=429,
+                headers={"Retry-After": "1", "X-RateLimit-Limit": str(capacity), "X-RateLimit-Remaining": "0"},
+            )
+        resp = await call_next(request)
+        resp.headers.setdefault("X-RateLimit-Limit", str(capacity))
+        return resp
+
+
+class BaselineCSRFMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: Callable):
+        if request.method in {"POST", "PUT", "PATCH", "DELETE"}:
+            sess = load_session(request.cookies.get(SESSION_COOKIE))
+            if sess:
+                supplied = request.headers.get("X-CSRF-Token")
+                if not supplied or supplied != issue_csrf_token(sess.user):
+                    return JSONResponse({"detail": "Invalid CSRF token"}, status_code=403)
+        return await call_next(request)
+
+
+async def ping(request):
+    return PlainTextResponse("ok")
+
+
+async def download(request):
+    async def body():
+        for _ in range(128):  # 8 MiB
+            yield CHUNK
+
+    return StreamingResponse(body(), media_type="application/octet-stream")
+
+
+def build(stack: str) -> Starlette:
+    app = Starlette(routes=[Route("/ping", ping, methods=["GET", "POST"]), Route("/download", download)])
+    if stack == "before":
+        app.add_middleware(BaselineRateLimitMiddleware, default_rate="1000000/second")
+        app.add_middleware(BaselineCSRFMiddleware)
+    elif stack == "after":
+        app.add_middleware(RateLimitMiddleware, default_rate="1000000/second", backend=MemoryBackend())
+        app.add_middleware(CSRFMiddleware)
+    return app
+
+
+def scope(method: str, path: str, headers: list[tuple[bytes, bytes]]) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def call(app, sc: dict) -> int:
+    sent = False
+    status = 0
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(sc), receive, send)
+    return status
+
+
+async def timed(app, sc: dict, n: int) -> float:
+    for _ in range(min(n, 500)):  # warm up
+        await call(app, sc)
+    start = time.perf_counter()
+    for _ in range(n):
+        status = await call(app, sc)
+    elapsed = time.perf_counter() - start
+    assert status == 200, status
+    return elapsed / n * 1e6
+
+
+async def main(n: int) -> None:
+    cookie = create_session_cookie("bench")
+    cases = {
+        "GET /ping": scope("GET", "/ping", []),
+        "POST /ping (session + CSRF)": scope(
+            "POST",
+            "/ping",
+            [(b"cookie", f"dash_session={cookie}".encode()), (b"x-csrf-token", issue_csrf_token("bench").encode())],
+        ),
+        "GET /download (8 MiB stream)": scope("GET", "/download", []),
+    }
+    apps = {stack: build(stack) for stack in ("bare", "before", "after")}
+    print(f"{'case':32} {'bare us':>10} {'before us':>10} {'after us':>10} {'before +':>10} {'after +':>10}")
+    for name, sc in cases.items():
+        runs = max(1, n // 100) if "download" in name else n
+        b, old, new = [await timed(app, sc, runs) for app in apps.values()]
+        print(f"{name:32} {b:10.1f} {old:10.1f} {new:10.1f} {old - b:10.1f} {new - b:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=20000, help="requests per case")
+    asyncio.run(main(parser.parse_args().n))
@@ -0,0 +1,65 @@
+"""CPU spent authenticating one cookie POST, uncached vs cached.
+
+"uncached" repeats what a cookie-authenticated POST used to do: three session
+decodes (CSRF middleware, require_user_or_hmac, require_session), each with a
+fresh signer, plus recomputing the CSRF token. "cached" is the current path:
+one lookup per request via request.state, served from the verified-cookie LRU.
+Run from the backend directory:
+
+    python scripts/bench_session.py [-n 50000]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from itsdangerous import URLSafeSerializer  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app.security.auth import SESSION_COOKIE, create_session_cookie, request_session  # noqa: E402
+from app.security.csrf import issue_csrf_token  # noqa: E402
+from app.settings import get_settings  # noqa: E402
+
+
+def uncached(cookie: str, token: str) -> None:
+    secret = get_settings().secret_key
+    for _ in range(3):
+        data = URLSafeSerializer(secret, salt="dash-session").loads(cookie)
+    expected = hmac.new(secret.encode(), f"csrf:{data['u']}".encode(), hashlib.sha256).hexdigest()
+    assert expected == token
+
+
+def cached(cookie: str, token: str) -> None:
+    scope = {"type": "http", "headers": [(b"cookie", f"{SESSION_COOKIE}={cookie}".encode())]}
+    for _ in range(3):
+        sess = request_session(Request(scope))
+    assert issue_csrf_token(sess.user) == token
+
+
+def timed(fn, n: int, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(*args)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main(n: int) -> None:
+    cookie = create_session_cookie("bench")
+    token = issue_csrf_token("bench")
+    before = timed(uncached, n, cookie, token)
+    after = timed(cached, n, cookie, token)
+    print(f"uncached {before:8.1f} us/request")
+    print(f"cached   {after:8.1f} us/request")
+    print(f"saved    {before - after:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=50000, help="requests to simulate")
+    main(parser.parse_args().n)
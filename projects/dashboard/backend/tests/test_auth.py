@@ -0,0 +1,42 @@
+import sys
+import threading
+import time
+
+from app.security.auth import Session, VerifiedCookies
+
+
+def test_verified_cookies_safe_across_threads():
+    # Sync dependencies resolve sessions on threadpool threads, all sharing one LRU
+    cache = VerifiedCookies(maxsize=8)
+    stop = threading.Event()
+    errors = []
+    gets = [0] * 4
+
+    def worker(n):
+        i = 0
+        try:
+            while not stop.is_set():
+                cookie = f"{n}:{i % 32}"
+                cache.put(cookie, Session("u", int(time.time())))
+                cache.get(cookie)
+                gets[n] += 1
+                i += 1
+        except Exception as e:  # pragma: no cover - only on a race
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    for t in threads:
+        t.start()
+    try:
+        time.sleep(0.5)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        sys.setswitchinterval(interval)
+    stats = cache.stats()
+    assert not errors
+    assert stats["entries"] <= 8
+    assert stats["hits"] + stats["misses"] == sum(gets)
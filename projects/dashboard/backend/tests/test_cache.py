@@ -0,0 +1,88 @@
+import asyncio
+import sys
+import threading
+import time
+
+from app.domains.reddit.cache import CacheEntry, LRUTier, ResponseCache, SQLiteTier
+
+
+def _fetcher(values):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return values[len(calls) - 1]
+
+    return fetch, calls
+
+
+def test_tag_invalidation_evicts_entry():
+    async def main():
+        cache = ResponseCache(LRUTier(1 << 20))
+        fetch, calls = _fetcher([{"v": 1}, {"v": 2}])
+        assert await cache.get_or_fetch("k", fetch, ttl=60, tags=["sub:a"]) == {"v": 1}
+        assert await cache.get_or_fetch("k", fetch, ttl=60, tags=["sub:a"]) == {"v": 1}
+        await cache.invalidate("sub:b")
+        assert await cache.get_or_fetch("k", fetch, ttl=60, tags=["sub:a"]) == {"v": 1}
+        await cache.invalidate("sub:a")
+        assert await cache.get_or_fetch("k", fetch, ttl=60, tags=["sub:a"]) == {"v": 2}
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_tags_survive_promotion_from_shared_tier(tmp_path):
+    async def main():
+        path = tmp_path / "cache.db"
+        fetch, calls = _fetcher([{"v": 1}, {"v": 2}])
+        await ResponseCache(LRUTier(1 << 20), SQLiteTier(path)).get_or_fetch("k", fetch, ttl=60, tags=["thing:t3_x"])
+
+        # Fresh worker: empty L1, entry comes from L2 and keeps its tags
+        cache = ResponseCache(LRUTier(1 << 20), SQLiteTier(path))
+        assert await cache.get_or_fetch("k", fetch, ttl=60) == {"v": 1}
+        assert cache.l1.get("k").tags == frozenset({"thing:t3_x"})
+        await cache.invalidate("thing:t3_x")
+        assert await cache.get_or_fetch("k", fetch, ttl=60) == {"v": 2}
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_peek_many_reads_shared_tier(tmp_path):
+    async def main():
+        path = tmp_path / "cache.db"
+        ResponseCache(LRUTier(1 << 20), SQLiteTier(path)).put("a", {"v": 1}, ttl=60, tags=["sub:a"])
+        cache = ResponseCache(LRUTier(1 << 20), SQLiteTier(path))
+        assert await cache.peek_many(["a", "b"]) == {"a": {"v": 1}}
+
+    asyncio.run(main())
+
+
+def test_lru_tier_safe_across_threads():
+    # PRAW threads put() while the loop invalidates; the OrderedDict must not be iterated mid-mutation
+    tier = LRUTier(1 << 20)
+    stop = threading.Event()
+
+    def writer(n):
+        i = 0
+        while not stop.is_set():
+            tier.set(f"{n}:{i % 2000}", CacheEntry(None, 64, 0.0, 0.0, frozenset({f"sub:{i % 7}"}), 0.0))
+            i += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    for t in threads:
+        t.start()
+    try:
+        deadline = time.monotonic() + 0.5
+        i = 0
+        while time.monotonic() < deadline:
+            tier.invalidate({f"sub:{i % 7}"})
+            i += 1
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        sys.setswitchinterval(interval)
+    assert tier.bytes == sum(e.size for e in tier._data.values())
@@ -0,0 +1,109 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.security import hmac as hmac_mod
+from app.security.hmac import KeyCache, new_key
+from app.security.rate_limit import limiter
+
+UPLOAD = "/api/v1/files/upload"
+
+
+@pytest.fixture(scope="module")
+def key():
+    return new_key(["files:read", "files:write"])
+
+
+@pytest.fixture
+def client():
+    limiter._tat.clear()
+    return TestClient(create_app())
+
+
+def _auth(key, method, path, body_hash):
+    kid, secret = key
+    ts, nonce = str(int(time.time())), uuid.uuid4().hex
+    canonical = "|".join([method, path, ts, nonce, body_hash])
+    sig = base64.b64encode(hmac.new(secret.encode(), canonical.encode(), hashlib.sha256).digest()).decode()
+    return {"Authorization": f"HMAC keyId={kid}, ts={ts}, nonce={nonce}, sig={sig}"}
+
+
+def _multipart(name, data):
+    head = f'--B\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n\r\n'.encode()
+    return head + data + b"\r\n--B--\r\n"
+
+
+def _upload(client, key, body, declared=None):
+    digest = declared or hashlib.sha256(body).hexdigest()
+    headers = _auth(key, "POST", UPLOAD, digest)
+    headers["content-type"] = "multipart/form-data; boundary=B"
+    if declared:
+        headers["X-Content-SHA256"] = declared
+    return client.post(UPLOAD, content=body, headers=headers)
+
+
+def test_buffered_signature_over_body(client, key):
+    r = _upload(client, key, _multipart("a.bin", b"hello"))
+    assert r.status_code == 200, r.text
+
+
+def test_declared_digest_streams(client, key):
+    body = _multipart("b.bin", b"hello")
+    r = _upload(client, key, body, declared=hashlib.sha256(body).hexdigest())
+    assert r.status_code == 200, r.text
+
+
+def test_declared_digest_mismatch_aborts_before_write(client, key):
+    body = _multipart("c.bin", b"hello")
+    declared = hashlib.sha256(body.replace(b"hello", b"jello")).hexdigest()
+    r = _upload(client, key, body, declared=declared)
+    assert r.status_code == 401 and r.json()["detail"] == "Body digest mismatch"
+    listing = client.get("/api/v1/files/list", headers=_auth(key, "GET", "/api/v1/files/list", hashlib.sha256(b"").hexdigest()))
+    assert "c.bin" not in {f["name"] for f in listing.json()}
+
+
+def test_replayed_nonce_rejected(client, key):
+    headers = _auth(key, "GET", "/api/v1/files/list", hashlib.sha256(b"").hexdigest())
+    assert client.get("/api/v1/files/list", headers=headers).status_code == 200
+    r = client.get("/api/v1/files/list", headers=headers)
+    assert r.status_code == 401 and r.json()["detail"] == "Replay detected"
+
+
+def test_unknown_key_ids_do_not_evict_known_keys(key):
+    # Made-up key ids land in the small negative cache; real keys stay cached
+    cache = KeyCache(ttl=300, check_every=300, maxsize=4, negative=2)
+
+    async def main():
+        rec = await cache.get(key[0])
+        for i in range(50):
+            assert await cache.get(f"nope{i}") is None
+        return rec, await cache.get(key[0])
+
+    first, again = asyncio.run(main())
+    assert again is first
+    stats = cache.stats()
+    assert (stats["entries"], stats["missing"]) == (1, 2)
+    assert stats["misses"] == 51 and stats["hits"] == 1
+
+
+def test_known_keys_evicted_least_recently_used(monkeypatch):
+    monkeypatch.setattr(hmac_mod, "_load_key", lambda kid: hmac_mod.KeyRecord(kid, frozenset(), None))
+    cache = KeyCache(ttl=300, check_every=300, maxsize=2)
+
+    async def main():
+        a = await cache.get("a")
+        await cache.get("b")
+        await cache.get("a")  # a is now the most recent
+        await cache.get("c")  # evicts b
+        return a, await cache.get("a")
+
+    a, again = asyncio.run(main())
+    assert again is a
+    assert cache.stats()["entries"] == 2 and cache.misses == 3
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from praw.exceptions import RedditAPIException
+
+from app import db
+from app.domains.reddit import jobs
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    db.init_db()
+    with db.connection() as conn:
+        conn.execute("DELETE FROM jobs")
+        conn.commit()
+
+
+def test_concurrent_claims_are_exclusive():
+    ids = {db.enqueue_job("comment", {"n": i})[0]["id"] for i in range(50)}
+    claimed, lock = [], threading.Lock()
+
+    def worker():
+        while (job := db.claim_job(300)) is not None:
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_scheduled_job_waits_for_run_at():
+    db.enqueue_job("submit", {}, run_at=time.time() + 3600)
+    assert db.claim_job(300) is None
+
+
+def test_idempotency_key_returns_original_job():
+    first, created = db.enqueue_job("message", {"to": "a"}, idempotency_key="message:k1")
+    again, created_again = db.enqueue_job("message", {"to": "b"}, idempotency_key="message:k1")
+    assert created and not created_again
+    assert again["id"] == first["id"] and again["payload"] == {"to": "a"}
+
+
+def test_lapsed_lease_is_reclaimed():
+    job, _ = db.enqueue_job("comment", {})
+    assert db.claim_job(-1)["id"] == job["id"]  # lease already lapsed
+    again = db.claim_job(300)
+    assert again["id"] == job["id"] and again["attempts"] == 2
+    assert db.claim_job(300) is None
+
+
+def _api_error(error_type, message):
+    return RedditAPIException([[error_type, message, None]])
+
+
+def test_ratelimit_error_is_retried_after_reddit_wait(monkeypatch):
+    async def submit(**_):
+        raise _api_error("RATELIMIT", "Looks like you've been doing that a lot. Take a break for 7 minutes before trying again.")
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "submit", submit)
+    db.enqueue_job("submit", {})
+    job = db.claim_job(300)
+    asyncio.run(jobs.JobWorker(0)._run(job))
+    row = db.get_job(job["id"])
+    assert row["status"] == "queued"
+    assert row["run_at"] >= time.time() + 7 * 60 - 5
+
+
+def test_other_api_errors_are_permanent(monkeypatch):
+    async def submit(**_):
+        raise _api_error("SUBREDDIT_NOEXIST", "that subreddit doesn't exist")
+
+    monkeypatch.setitem(jobs.JOB_KINDS, "submit", submit)
+    db.enqueue_job("submit", {})
+    job = db.claim_job(300)
+    asyncio.run(jobs.JobWorker(0)._run(job))
+    assert db.get_job(job["id"])["status"] == "failed"
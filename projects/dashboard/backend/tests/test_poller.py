@@ -0,0 +1,54 @@
+import asyncio
+
+from app.domains.reddit import poller as poller_mod
+from app.domains.reddit.poller import QueuePoller, WatchKey
+
+
+def test_subscriber_sees_pings_and_errors_before_first_snapshot(monkeypatch):
+    calls = []
+
+    async def queue_items(profile, sub, queue):
+        calls.append(queue)
+        await asyncio.sleep(0.05)
+        if len(calls) == 1:
+            raise RuntimeError("upstream down")
+        return [{"name": "t3_a"}]
+
+    monkeypatch.setattr(poller_mod, "queue_items", queue_items)
+    monkeypatch.setattr(poller_mod, "KEEPALIVE", 0.02)
+
+    async def main():
+        p = QueuePoller(0.01)
+        events = []
+        async for ev in p.subscribe(WatchKey("p", "python", "modqueue")):
+            events.append(ev)
+            if ev["type"] == "snapshot":
+                break
+        await p.stop()
+        return events
+
+    events = asyncio.run(asyncio.wait_for(main(), 5))
+    types = [ev["type"] for ev in events]
+    assert types[0] == "ping"
+    assert "error" in types and types.index("error") < types.index("snapshot")
+    assert events[types.index("error")]["error"] == "upstream down"
+    assert events[-1]["items"] == [{"name": "t3_a"}]
+
+
+def test_late_subscriber_gets_snapshot_immediately(monkeypatch):
+    async def queue_items(profile, sub, queue):
+        return [{"name": "t3_a"}]
+
+    monkeypatch.setattr(poller_mod, "queue_items", queue_items)
+
+    async def main():
+        p = QueuePoller(10)
+        key = WatchKey("p", "python", "modqueue")
+        first = p.subscribe(key)
+        assert (await first.__anext__())["type"] == "snapshot"
+        second = await p.subscribe(key).__anext__()
+        await first.aclose()
+        await p.stop()
+        return second
+
+    assert asyncio.run(asyncio.wait_for(main(), 5))["items"] == [{"name": "t3_a"}]
@@ -0,0 +1,57 @@
+import base64
+import hashlib
+import hmac
+import time
+import uuid
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.security.hmac import new_key
+from app.security.rate_limit import limiter
+
+PROXY = "/api/v1/reddit/p/proxy"
+
+
+@pytest.fixture(scope="module")
+def read_key():
+    return new_key(["reddit:read"])
+
+
+@pytest.fixture
+def client():
+    limiter._tat.clear()
+    return TestClient(create_app())
+
+
+def _post(client, key, path, payload, params=None):
+    kid, secret = key
+    body = orjson.dumps(payload)
+    ts, nonce = str(int(time.time())), uuid.uuid4().hex
+    canonical = "|".join(["POST", path, ts, nonce, hashlib.sha256(body).hexdigest()])
+    sig = base64.b64encode(hmac.new(secret.encode(), canonical.encode(), hashlib.sha256).digest()).decode()
+    headers = {"Authorization": f"HMAC keyId={kid}, ts={ts}, nonce={nonce}, sig={sig}", "content-type": "application/json"}
+    return client.post(path, content=body, headers=headers, params=params)
+
+
+def test_read_key_may_call_read_ops(client, read_key):
+    # Invalid params: rejected by validation (422), i.e. past auth and the scope check
+    r = _post(client, read_key, PROXY, {"nope": 1}, {"namespace": "subreddit", "operation": "about"})
+    assert r.status_code == 422, r.text
+
+
+def test_read_key_refused_write_ops(client, read_key):
+    r = _post(client, read_key, PROXY, {"thing_id": "t3_x"}, {"namespace": "mod", "operation": "approve"})
+    assert r.status_code == 403 and "reddit:write" in r.json()["detail"]
+
+
+def test_batch_checks_scope_per_call(client, read_key):
+    calls = [
+        {"namespace": "mod", "operation": "approve", "params": {"thing_id": "t3_x"}},
+        {"namespace": "subreddit", "operation": "about", "params": {"nope": 1}},
+    ]
+    r = _post(client, read_key, PROXY + "/batch", calls)
+    assert r.status_code == 200, r.text
+    assert [res["status"] for res in r.json()["results"]] == [403, 422]
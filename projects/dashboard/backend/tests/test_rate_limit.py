@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from app.security import rate_limit
+from app.security.rate_limit import MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    return MemoryBackend() if request.param == "memory" else SQLiteBackend(tmp_path / "rl.db")
+
+
+def test_burst_then_limited(backend):
+    decisions = [backend.check("k", 5, 60) for _ in range(6)]
+    assert [d.allowed for d in decisions] == [True] * 5 + [False]
+    assert [d.remaining for d in decisions[:5]] == [4, 3, 2, 1, 0]
+    assert decisions[-1].retry_after == pytest.approx(12, abs=0.5)
+    assert decisions[-1].reset == pytest.approx(60, abs=0.5)
+
+
+def test_keys_are_independent(backend):
+    for _ in range(2):
+        backend.check("a", 2, 60)
+    assert not backend.check("a", 2, 60).allowed
+    assert backend.check("b", 2, 60).allowed
+
+
+def test_refills_over_window(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    for _ in range(3):
+        assert backend.check("k", 3, 3).allowed
+    assert not backend.check("k", 3, 3).allowed
+    now[0] += 1.0
+    assert backend.check("k", 3, 3).allowed
+    assert not backend.check("k", 3, 3).allowed
+
+
+def test_memory_backend_caps_keys():
+    b = MemoryBackend(max_keys=10)
+    for i in range(100):
+        b.check(f"ip{i}", 10, 60)
+    assert b.stats()["keys"] <= 10
+    assert b.stats()["evicted"] == 90
+
+
+def test_sqlite_backend_fails_open_when_locked(tmp_path):
+    path = tmp_path / "rl.db"
+    b = SQLiteBackend(path)
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        assert b.check("k", 1, 60).allowed
+    finally:
+        holder.execute("ROLLBACK")
+    assert b.stats()["failed_open"] == 1
@@ -0,0 +1,39 @@
+from collections import Counter
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from app.domains.reddit import router as reddit_router
+from app.domains.reddit.ops import SPECS
+from app.main import create_app
+
+
+def test_every_op_namespace_reachable():
+    app = create_app()
+    app.dependency_overrides[reddit_router.read_dep.dependency] = lambda: True
+    client = TestClient(app, raise_server_exceptions=False)
+    # /ops/{namespace}/{operation} must not fall through to a /{profile}/{namespace}/... route
+    namespaces = {}
+    for spec in SPECS:
+        namespaces.setdefault(spec.name.split(".", 1)[0], spec.name)
+    for name in namespaces.values():
+        namespace, operation = name.split(".", 1)
+        r = client.get(f"/api/v1/reddit/ops/{namespace}/{operation}")
+        assert r.status_code == 200, (name, r.status_code, r.text)
+        assert r.json() == reddit_router.lookup_op(name).schema
+
+
+def test_no_duplicate_routes():
+    routes = [r for group in (reddit_router.read, reddit_router.write) for r in group.routes if isinstance(r, APIRoute)]
+    seen = Counter((r.path, m) for r in routes for m in r.methods)
+    assert [k for k, n in seen.items() if n > 1] == []
+
+
+def test_state_changing_routes_need_write_scope():
+    # The proxy routes are the only POSTs on the read router: they check reddit:write per op
+    unsafe = {
+        r.path
+        for r in reddit_router.read.routes
+        if isinstance(r, APIRoute) and r.methods - {"GET", "HEAD"}
+    }
+    assert unsafe == {"/{profile}/proxy", "/{profile}/proxy/batch"}
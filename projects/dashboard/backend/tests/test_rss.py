@@ -0,0 +1,18 @@
+import asyncio
+import time
+
+import pytest
+
+from app.domains.reddit.rss import rss
+from app.domains.reddit.scheduler import RateLimited, scheduler
+from app.domains.reddit.services import reddit_listing
+
+
+def test_scheduler_refusal_does_not_trip_breaker():
+    ps = scheduler.for_profile("rss-refused")
+    ps.remaining = 0
+    ps.reset_at = time.time() + 1000
+    for _ in range(rss.threshold + 1):
+        with pytest.raises(RateLimited):
+            asyncio.run(reddit_listing("rss-refused", "python", "new", None, 25))
+    assert rss.use_api("rss-refused:python")
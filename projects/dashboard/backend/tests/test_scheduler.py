@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+from app.domains.reddit.scheduler import BULK, INTERACTIVE, ProfileScheduler, RateLimited
+
+
+def _scheduler(slots=1):
+    return ProfileScheduler("p", slots, {INTERACTIVE: 5.0, BULK: 120.0})
+
+
+def test_refuses_when_budget_reset_exceeds_slo():
+    async def main():
+        ps = _scheduler()
+        ps.remaining = 0
+        ps.reset_at = time.time() + 1000
+        with pytest.raises(RateLimited) as exc:
+            async with ps.slot(BULK):
+                pass
+        assert exc.value.retry_after > 900
+        assert ps.rejected == 1 and ps.active == 0
+
+    asyncio.run(main())
+
+
+def test_admits_when_budget_reset_within_slo():
+    async def main():
+        ps = _scheduler()
+        ps.remaining = 0
+        ps.reset_at = time.time() + 0.05
+        async with ps.slot(INTERACTIVE):
+            pass
+        assert ps.admitted == 1 and ps.budget_waits == 1
+
+    asyncio.run(main())
+
+
+def test_interactive_overtakes_queued_bulk():
+    async def main():
+        ps = _scheduler(slots=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def call(prio, name):
+            async with ps.slot(prio):
+                order.append(name)
+                await gate.wait()
+
+        first = asyncio.ensure_future(call(INTERACTIVE, "first"))
+        await asyncio.sleep(0)
+        bulk = asyncio.ensure_future(call(BULK, "bulk"))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(call(INTERACTIVE, "interactive"))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, bulk, interactive)
+        assert order == ["first", "interactive", "bulk"]
+        assert ps.active == 0
+
+    asyncio.run(main())
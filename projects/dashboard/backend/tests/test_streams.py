@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.domains.reddit import router as reddit_router
+from app.domains.reddit.scheduler import RateLimited, scheduler
+from app.domains.reddit.services import STREAM_PAGE, _stream
+from app.main import create_app
+from app.security.rate_limit import limiter
+
+
+async def _drain(profile, produce):
+    return [item async for item in await _stream(profile, produce, lambda obj: {"v": obj})]
+
+
+def _refuse(profile):
+    ps = scheduler.for_profile(profile)
+    ps.remaining = 0
+    ps.reset_at = time.time() + 1000
+
+
+def test_stream_yields_items():
+    items = asyncio.run(_drain("stream-ok", lambda: iter(range(5))))
+    assert [i["v"] for i in items] == list(range(5))
+
+
+def test_stream_refused_before_start_raises():
+    _refuse("stream-refused")
+    started = []
+
+    def produce():
+        started.append(True)
+        return iter(())
+
+    with pytest.raises(RateLimited):
+        asyncio.run(asyncio.wait_for(_drain("stream-refused", produce), 5))
+    assert not started
+
+
+def test_stream_holds_no_slot_between_pages():
+    ps = scheduler.for_profile("stream-paged")
+
+    async def main():
+        items = await _stream("stream-paged", lambda: iter(range(STREAM_PAGE * 2 + 5)), lambda obj: {"v": obj})
+        first = await items.__anext__()
+        # Consumer stalls after one item: the prefetch completes and gives its slot back
+        for _ in range(200):
+            if ps.admitted == 2 and ps.active == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert (ps.admitted, ps.active) == (2, 0)
+        return [first, *[i async for i in items]]
+
+    items = asyncio.run(main())
+    assert [i["v"] for i in items] == list(range(STREAM_PAGE * 2 + 5))
+    assert ps.admitted == 3
+
+
+def test_refused_stream_request_is_429():
+    app = create_app()
+    app.dependency_overrides[reddit_router.read_dep.dependency] = lambda: True
+    _refuse("stream-http")
+    limiter._tat.clear()
+    r = TestClient(app).get("/api/v1/reddit/stream-http/r/python/new", params={"stream": "true"})
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) > 0
+
+
+def test_refusal_mid_stream_ends_with_error_trailer():
+    async def items():
+        yield {"name": "t3_a"}
+        yield {"name": "t3_b"}
+        raise RateLimited("p", 30)
+
+    async def main():
+        return [i async for i in reddit_router.paged(items(), 25)]
+
+    *rows, trailer = asyncio.run(main())
+    assert len(rows) == 2
+    assert trailer["done"] is False and trailer["after"] == "t3_b" and trailer["retry_after"] == 30